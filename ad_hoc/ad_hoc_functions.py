@@ -4,10 +4,38 @@ from celery import current_app as celery  # Access the current Celery app
 from datetime import datetime, timedelta  # To define scheduling intervals
 from datetime import timedelta
 from celery.schedules import schedule as celery_schedule
+import os
 import json
 import logging
 from executors.extensions import db 
 from executors.models import DefAsyncTask, DefAsyncTaskParam, DefAsyncTaskSchedule, DefAsyncTaskScheduleNew
+from executors.redis_client import redis_client
+
+# IMMEDIATE runs go to a queue of their own, served by a dedicated worker, so they do not wait
+# behind a burst of scheduled runs (see the interactive worker profile in README.md)
+INTERACTIVE_LANE_ENABLED = os.getenv("INTERACTIVE_LANE_ENABLED", "N").upper() in ("Y", "YES", "TRUE", "1")
+INTERACTIVE_QUEUE = os.getenv("INTERACTIVE_QUEUE", "interactive")
+INTERACTIVE_MAX_DEPTH = int(os.getenv("INTERACTIVE_MAX_DEPTH", "50"))  # waiting runs beyond which new ones take the normal route
+
+
+def ad_hoc_queue(queue=None):
+    """
+    Queue for an IMMEDIATE run: the task's own queue_name if it has one, otherwise the interactive
+    lane. Once INTERACTIVE_MAX_DEPTH runs are already waiting there, further runs are demoted to the
+    normal route (None), so bulk submissions through the ad-hoc API cannot take the lane over and
+    the interactive worker's latency stays bounded.
+    """
+    if queue or not INTERACTIVE_LANE_ENABLED:
+        return queue
+    try:
+        depth = redis_client.llen(INTERACTIVE_QUEUE)  # Redis transport: one list per queue, named after it
+    except Exception as e:
+        logging.warning(f"Could not read the depth of queue '{INTERACTIVE_QUEUE}': {e}")
+        return INTERACTIVE_QUEUE
+    if depth >= INTERACTIVE_MAX_DEPTH:
+        logging.warning(f"Queue '{INTERACTIVE_QUEUE}' holds {depth} runs; sending this ad-hoc run on the normal route")
+        return None
+    return INTERACTIVE_QUEUE
 
 
 def execute_ad_hoc_task(user_schedule_name, task_name, executor, args, kwargs, cancelled_yn, created_by):
@@ -66,7 +94,7 @@ def execute_ad_hoc_task(user_schedule_name, task_name, executor, args, kwargs, c
 
 
 
-def execute_ad_hoc_task_v1(user_schedule_name, task_name, executor, args, kwargs, schedule_type, cancelled_yn, created_by):
+def execute_ad_hoc_task_v1(user_schedule_name, task_name, executor, args, kwargs, schedule_type, cancelled_yn, created_by, queue=None):
     """
     Executes a task immediately using Celery and logs the execution in the database.
 
@@ -76,6 +104,7 @@ def execute_ad_hoc_task_v1(user_schedule_name, task_name, executor, args, kwargs
         kwargs (dict): The keyword arguments for the task.
         cancelled_yn (str): The cancellation status ('N' by default).
         created_by (int): ID of the user who created the task.
+        queue (str): The task's own Celery queue (optional; see ad_hoc_queue() when None).
 
     Returns:
         dict: A success response containing task execution details.
@@ -90,8 +119,10 @@ def execute_ad_hoc_task_v1(user_schedule_name, task_name, executor, args, kwargs
         if not isinstance(kwargs, dict):
             raise ValueError("`kwargs` must be a dictionary.")
 
-        # Execute the task immediately using Celery
-        celery.send_task(executor, args=args, kwargs=kwargs)
+        # Execute the task immediately using Celery, on the interactive lane when it has room
+        queue = ad_hoc_queue(queue)
+        options = {"queue": queue} if queue else {}
+        celery.send_task(executor, args=args, kwargs=kwargs, **options)
 
         # Log the execution in the database
         new_schedule = DefAsyncTaskScheduleNew(
@@ -112,7 +143,8 @@ def execute_ad_hoc_task_v1(user_schedule_name, task_name, executor, args, kwargs
         # Return a success response
         return {
             "message": "Ad-hoc task executed and logged successfully!",
-            "schedule_id": new_schedule.def_task_sche_id
+            "schedule_id": new_schedule.def_task_sche_id,
+            "queue": queue
         }
     except Exception as e:
         db.session.rollback()
@@ -11,6 +11,7 @@ from .access_profiles import access_profiles_bp
 from .tasks import tasks_bp
 from .access_point_elements import access_point_elements_bp
 from .redis import reidis_bp
+from .metrics import metrics_bp
 
 def register_blueprints(app):
     app.register_blueprint(controls_bp)
@@ -25,3 +26,4 @@ def register_blueprints(app):
     app.register_blueprint(enterprises_bp)
     app.register_blueprint(access_profiles_bp)
     app.register_blueprint(access_point_elements_bp)
+    app.register_blueprint(metrics_bp)
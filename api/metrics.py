@@ -0,0 +1,23 @@
+import os
+import hmac
+import logging
+from flask import Blueprint, Response, request, jsonify
+
+from executors.metrics import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # optional bearer token Prometheus must send; scrapes are open when unset
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            return jsonify({"message": "Unauthorized"}), 401
+    try:
+        return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+    except Exception as e:
+        logging.exception("Failed to render metrics")
+        return jsonify({"message": "Failed to render metrics", "error": str(e)}), 500
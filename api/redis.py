@@ -4,7 +4,7 @@ from zoneinfo import ZoneInfo
 from datetime import datetime, timezone
 from config import redis_url
 from redis import Redis
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from datetime import datetime, timezone
 
 
@@ -278,3 +278,47 @@ def get_redbeat_scheduled_task(task_key):
 
 
 
+@reidis_bp.route('/task_output/<string:task_id>', methods=['GET'])
+def get_task_output(task_id):
+    """
+    Live tail of a running task's output (bash executor).
+
+    Query params:
+        after (str): last stream id the client has seen; '0' (default) reads from the start.
+        count (int): max lines to return (default 500).
+    Poll again with the returned last_id until finished is true.
+    """
+    try:
+        after = request.args.get('after', '0')
+        count = min(int(request.args.get('count', 500)), 5000)
+        stream_key = f"task_output:{task_id}"
+
+        if not redis_client.exists(stream_key):
+            return jsonify({"error": "No output found for this task"}), 404
+
+        entries = redis_client.xrange(stream_key, min=f"({after}" if after != '0' else '-', max='+', count=count)
+
+        lines = []
+        finished = False
+        truncated = False
+        last_id = after
+        for entry_id, fields in entries:
+            last_id = entry_id
+            if fields.get("stream") == "eof":
+                finished = True
+                truncated = fields.get("line") == "truncated"
+                break
+            lines.append({"id": entry_id, "stream": fields.get("stream"), "line": fields.get("line")})
+
+        return jsonify({
+            "task_id": task_id,
+            "lines": lines,
+            "last_id": last_id,
+            "finished": finished,
+            "truncated": truncated
+        })
+
+    except ValueError:
+        return jsonify({"error": "count must be an integer"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -7,7 +7,7 @@ from flask import request, jsonify, make_response       # Flask utilities for ha
 
 from celery import current_app as celery  # Access the current Celery app
 
-from redbeat_s.red_functions import create_redbeat_schedule, update_redbeat_schedule, delete_schedule_from_redis
+from redbeat_s.red_functions import create_redbeat_schedule, update_redbeat_schedule, update_redbeat_queue, delete_schedule_from_redis
 from ad_hoc.ad_hoc_functions import execute_ad_hoc_task, execute_ad_hoc_task_v1
 
 from flask import Blueprint, request, jsonify, make_response
@@ -16,6 +16,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 
 from executors.extensions import db
+from executors.run_limits import parse_rate
 from executors.models import (
     DefAsyncTask,
     DefAsyncTaskParam,
@@ -29,6 +30,17 @@ from executors.models import (
 tasks_bp = Blueprint('tasks', __name__)
 
 
+def run_limits_error(max_concurrency, rate_limit):
+    """Validation message for a task's max_concurrency / rate_limit, or None when both are valid (or unset)."""
+    if max_concurrency not in (None, "") and not str(max_concurrency).isdigit():
+        return "max_concurrency must be a non-negative integer (0 or empty for no limit)."
+    try:
+        parse_rate(rate_limit)
+    except ValueError:
+        return "rate_limit must be '<runs>/<s|m|h>', e.g. '30/m'."
+    return None
+
+
 @tasks_bp.route('/Create_ExecutionMethod', methods=['POST'])
 @jwt_required()
 def Create_ExecutionMethod():
@@ -224,6 +236,17 @@ def Create_Task():
         description = request.json.get('description')
         srs = request.json.get('srs')
         sf  = request.json.get('sf')
+        execution_mode = request.json.get('execution_mode')
+        max_retries = request.json.get('max_retries')
+        retry_backoff = request.json.get('retry_backoff')
+        def_data_source_id = request.json.get('def_data_source_id')
+        queue_name = request.json.get('queue_name')
+        max_concurrency = request.json.get('max_concurrency')
+        rate_limit = request.json.get('rate_limit')
+
+        error = run_limits_error(max_concurrency, rate_limit)
+        if error:
+            return {"message": error}, 400
 
         new_task = DefAsyncTask(
             user_task_name = user_task_name,
@@ -237,6 +260,13 @@ def Create_Task():
             cancelled_yn = 'N',
             srs = srs,
             sf  = sf,
+            execution_mode = execution_mode,
+            max_retries = max_retries,
+            retry_backoff = retry_backoff,
+            def_data_source_id = def_data_source_id,
+            queue_name = queue_name,
+            max_concurrency = int(max_concurrency) if max_concurrency not in (None, "") else None,
+            rate_limit = rate_limit or None,
             created_by = 101
             #last_updated_by=last_updated_by
 
@@ -334,6 +364,11 @@ def Update_Task(task_name):
     try:
         task = DefAsyncTask.query.filter_by(task_name=task_name).first()
         if task:
+            error = run_limits_error(request.json.get('max_concurrency'), request.json.get('rate_limit'))
+            if error:
+                return make_response(jsonify({"message": error}), 400)
+
+            previous_queue = task.queue_name
             # Only update fields that are provided in the request
             if 'user_task_name' in request.json:
                 task.user_task_name = request.json.get('user_task_name')
@@ -347,12 +382,38 @@ def Update_Task(task_name):
                 task.srs = request.json.get('srs')
             if 'sf' in request.json:
                 task.sf = request.json.get('sf')
+            if 'execution_mode' in request.json:
+                task.execution_mode = request.json.get('execution_mode')
+            if 'max_retries' in request.json:
+                task.max_retries = request.json.get('max_retries')
+            if 'retry_backoff' in request.json:
+                task.retry_backoff = request.json.get('retry_backoff')
+            if 'def_data_source_id' in request.json:
+                task.def_data_source_id = request.json.get('def_data_source_id')
+            if 'queue_name' in request.json:
+                task.queue_name = request.json.get('queue_name') or None
+            if 'max_concurrency' in request.json:
+                max_concurrency = request.json.get('max_concurrency')
+                task.max_concurrency = int(max_concurrency) if max_concurrency not in (None, "") else None
+            if 'rate_limit' in request.json:
+                task.rate_limit = request.json.get('rate_limit') or None
             if 'last_updated_by' in request.json:
                 task.last_updated_by = request.json.get('last_updated_by')
 
             # Update the timestamps to reflect the modification time
             task.updated_at = datetime.utcnow()
 
+            # Existing RedBeat entries carry the queue in their options, so move them along with the task
+            if task.queue_name != previous_queue:
+                # Cancelled and finished schedules are no longer in Redis and are skipped
+                schedules = DefAsyncTaskScheduleNew.query.filter_by(task_name=task_name).all()
+                try:
+                    for schedule in schedules:
+                        update_redbeat_queue(schedule.redbeat_schedule_name, task.queue_name, celery_app=celery)
+                except Exception as e:
+                    db.session.rollback()
+                    return make_response(jsonify({"message": "Error updating Redis. Database changes rolled back.", "error": str(e)}), 500)
+
             db.session.commit()
             return make_response(jsonify({"message": "DEF async Task updated successfully"}), 200)
 
@@ -721,7 +782,8 @@ def Create_TaskSchedule():
                     kwargs=kwargs,
                     schedule_type=schedule_type,
                     cancelled_yn='N',
-                    created_by=101
+                    created_by=101,
+                    queue=task.queue_name
                 )
                 return jsonify(result), 201
             except Exception as e:
@@ -738,7 +800,8 @@ def Create_TaskSchedule():
                 cron_schedule=cron_schedule if cron_schedule else None,
                 args=args,
                 kwargs=kwargs,
-                celery_app=celery
+                celery_app=celery,
+                queue=task.queue_name
             )
         except Exception as e:
             return jsonify({"error": "Failed to create RedBeat schedule", "details": str(e)}), 500
@@ -932,7 +995,8 @@ def Update_TaskSchedule(task_name):
                 cron_schedule=cron_schedule,
                 args=schedule.args,
                 kwargs=schedule.kwargs,
-                celery_app=celery
+                celery_app=celery,
+                queue=executors.queue_name
             )
         except Exception as e:
             db.session.rollback()
@@ -1062,7 +1126,8 @@ def Reschedule_TaskSchedule(task_name):
                 cron_schedule=cron_schedule,
                 args=schedule.args,
                 kwargs=schedule.kwargs,
-                celery_app=celery
+                celery_app=celery,
+                queue=executor.queue_name
             )
             print(executor)
             
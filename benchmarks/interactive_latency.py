@@ -0,0 +1,123 @@
+# interactive_latency.py
+#
+# Start latency of IMMEDIATE (ad-hoc) runs while a burst of scheduled runs is queued, with and
+# without the interactive lane (ad_hoc_queue() in ad_hoc/ad_hoc_functions.py).
+#
+# Runs two in-process workers against the configured broker: a "scheduled" worker (--workers
+# slots) and an interactive worker (one slot). It queues --burst scheduled runs of --work seconds
+# each, then submits --probes ad-hoc runs, one every --interval seconds, and measures each probe's
+# wait from send_task to the start of the task. The lane passes when its p95 is within --target.
+#
+# Usage:
+#     INTERACTIVE_LANE_ENABLED=Y python benchmarks/interactive_latency.py [--broker redis://localhost:6379/0]
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from celery.contrib.testing.worker import start_worker
+
+import executors
+from ad_hoc.ad_hoc_functions import ad_hoc_queue, INTERACTIVE_QUEUE
+
+SCHEDULED_QUEUE = "latency_benchmark_scheduled"
+
+app = executors.celery_app
+started = {}
+started_lock = threading.Lock()
+
+
+@app.task(name="benchmarks.interactive_latency.work", ignore_result=True)
+def work(probe_id, seconds):
+    if probe_id is not None:
+        with started_lock:
+            started[probe_id] = time.time()
+    time.sleep(seconds)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def purge(*queues):
+    with app.connection_for_write() as conn:
+        for queue in queues:
+            try:
+                conn.default_channel.queue_purge(queue)
+            except Exception:
+                pass
+
+
+def run(mode, options):
+    """Probe start latencies (seconds) with the probes sent to the interactive lane or behind the burst."""
+    started.clear()
+    for _ in range(options.burst):
+        work.apply_async((None, options.work), queue=SCHEDULED_QUEUE)
+
+    submitted = {}
+    for probe_id in range(options.probes):
+        queue = ad_hoc_queue() if mode == "lane" else None
+        submitted[probe_id] = time.time()
+        work.apply_async((probe_id, 0), queue=queue or SCHEDULED_QUEUE)
+        time.sleep(options.interval)
+
+    deadline = time.time() + options.burst * options.work + 60
+    while len(started) < options.probes and time.time() < deadline:
+        time.sleep(0.05)
+    return [started[probe_id] - submitted[probe_id] for probe_id in submitted if probe_id in started]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--broker", help="broker URL (default: MESSAGE_BROKER); plain redis:// URLs disable TLS")
+    parser.add_argument("--burst", type=int, default=200, help="scheduled runs queued before the probes")
+    parser.add_argument("--work", type=float, default=0.2, help="seconds each scheduled run takes")
+    parser.add_argument("--workers", type=int, default=4, help="slots of the scheduled worker")
+    parser.add_argument("--probes", type=int, default=20, help="ad-hoc runs measured per mode")
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between ad-hoc runs")
+    parser.add_argument("--target", type=float, default=1.0, help="p95 start latency the lane must meet, seconds")
+    options = parser.parse_args()
+
+    if options.broker:
+        app.conf.broker_url = options.broker
+        if options.broker.startswith("redis://"):
+            app.conf.broker_use_ssl = None
+    app.conf.task_routes = {}
+    app.conf.worker_enable_remote_control = False  # two workers in one process would share the pidbox connection
+    app.conf.worker_prefetch_multiplier = 1
+
+    scheduled = start_worker(app, pool="threads", concurrency=options.workers, queues=[SCHEDULED_QUEUE],
+                             perform_ping_check=False, loglevel="WARNING", shutdown_timeout=60)
+    interactive = start_worker(app, pool="threads", concurrency=1, queues=[INTERACTIVE_QUEUE],
+                               perform_ping_check=False, loglevel="WARNING", shutdown_timeout=60)
+    failed = False
+    purge(SCHEDULED_QUEUE, INTERACTIVE_QUEUE)
+    with scheduled, interactive:
+        print(f"{'mode':<10} {'probes':>6} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+        for mode in ("baseline", "lane"):
+            if mode == "lane" and ad_hoc_queue() is None:
+                print("lane       skipped: set INTERACTIVE_LANE_ENABLED=Y")
+                failed = True
+                continue
+            latencies = run(mode, options)
+            if not latencies:
+                print(f"{mode:<10} no probe started")
+                failed = True
+                continue
+            p95 = percentile(latencies, 0.95)
+            print(f"{mode:<10} {len(latencies):>6} {statistics.median(latencies):>8.3f} {p95:>8.3f} {max(latencies):>8.3f}")
+            if mode == "lane":
+                verdict = "PASS" if p95 <= options.target and len(latencies) == options.probes else "FAIL"
+                failed = verdict == "FAIL"
+                print(f"{verdict}: interactive p95 {p95:.3f}s, target {options.target:.3f}s")
+        purge(SCHEDULED_QUEUE)  # the lane run's leftover burst
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# pg_sleep_gevent.py
+#
+# Runs N concurrent pg_sleep calls on one gevent hub through the executors' connection pool,
+# first with plain (blocking) psycopg2 and then with the gevent wait callback enabled.
+# Without the callback the calls serialize (~N x sleep); with it they overlap (~1 x sleep).
+#
+# Usage:
+#     DATABASE_URL=postgresql://... python benchmarks/pg_sleep_gevent.py [N] [sleep_seconds]
+from gevent import monkey
+monkey.patch_all()
+
+import os
+import sys
+import time
+
+import gevent
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executors.db_pool import ConnectionPool
+from executors.green import enable_wait_callback, disable_wait_callback
+
+
+def run(pool, n, seconds):
+    def call():
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(%s);", (seconds,))
+            conn.commit()
+
+    start = time.perf_counter()
+    gevent.joinall([gevent.spawn(call) for _ in range(n)], raise_error=True)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    dsn = os.environ["DATABASE_URL"]
+
+    for label, setup in (("blocking", disable_wait_callback), ("gevent wait callback", enable_wait_callback)):
+        setup()
+        pool = ConnectionPool(dsn, max_size=n, min_size=n)   # pre-open so only query time is measured
+        try:
+            elapsed = run(pool, n, seconds)
+        finally:
+            pool.closeall()
+        print(f"{label:>22}: {n} x pg_sleep({seconds}) in {elapsed:.2f}s ({elapsed / seconds:.1f}x sleep time)")
+
+    disable_wait_callback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# result_size.py
+#
+# Bytes stored per task result with the pre-v1 executor dicts (args, kwargs, often parameters and the
+# full schedule spec copied into every result) against the v1 envelope (executors/envelope.py).
+# Sizes are given as compact JSON, as written to def_async_task_requests, and as pickle, as
+# written to the db+ result backend's celery_taskmeta table.
+#
+# Usage:
+#     python benchmarks/result_size.py
+import os
+import sys
+import json
+import pickle
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executors.envelope import envelope
+
+SCHEDULE = {
+    "schedule_type": "WEEKLY_SPECIFIC_DAYS",
+    "values": ["MON", "TUE", "WED", "THU", "FRI"],
+    "times": ["06:00", "12:00", "18:00"],
+    "timezone": "Asia/Dhaka",
+    "start_date": "2025-01-01",
+    "end_date": "2026-12-31",
+}
+
+
+def legacy(executor, args, kwargs, result, message, parameters=True, **extra):
+    """
+    The dict an executor returned before the v1 envelope. Every executor copied the schedule spec
+    and args; the stored procedure/function and script executors also repeated kwargs as parameters.
+    """
+    before = {
+        "user_task_name": args[1],
+        "task_name": args[2],
+        "executor": executor,
+        "user_schedule_name": args[3],
+        "redbeat_schedule_name": args[4],
+        "schedule_type": args[5],
+        "schedule": args[6],
+        "args": args,
+        "kwargs": kwargs,
+    }
+    if parameters:
+        before["parameters"] = kwargs
+    return {**before, **extra, "result": result, "message": message}
+
+
+def cases():
+    """(name, result before, result after) as the executors build them, before and after the change."""
+    rng = random.Random(7)
+    args = ["proc_sync_users", "Sync users", "sync_users", "Sync users (weekdays)",
+            "sync_users_weekdays_7f3a", "WEEKLY_SPECIFIC_DAYS", SCHEDULE]
+
+    executor = "executors.stored_procedure.execute"
+    params = {"p_tenant_id": 1001, "p_source": "hr", "p_full_refresh": False, "p_since": "2026-10-01"}
+    message = "Stored procedure executed successfully!"
+    result = {"rows_synced": 1532}
+    yield ("procedure, scalar result", legacy(executor, args, params, result, message),
+           envelope(executor, tuple(args), params, result, message))
+
+    executor = "executors.http.execute"
+    payload = {}
+    rows = [{"id": i, "name": f"user_{i}", "email": f"user_{i}@example.com", "active": bool(i % 3),
+             "score": round(rng.random() * 100, 2)} for i in range(400)]
+    message = "HTTP request executed successfully."
+    extra = {"url": "https://api.example.com/users", "method": "GET", "status_code": 200}
+    yield ("http GET, 40KB JSON body",
+           legacy(executor, args, payload, {"users": rows}, message, parameters=False, **extra, attempts=1),
+           envelope(executor, tuple(args), payload, {"users": rows}, message, **extra, attempts=1))
+
+    # The batch result already stored only {commit_every, batch_size} as kwargs, not the items
+    executor = "executors.stored_procedure.execute"
+    summary = {"commit_every": 500, "batch_size": 2000}
+    statuses = [{"index": i, "ok": True} for i in range(2000)]
+    result = {"total": 2000, "succeeded": 2000, "failed": 0, "items": statuses}
+    message = "Stored procedure batch executed successfully!"
+    yield ("procedure batch, 2000 items", legacy(executor, args, summary, result, message, parameters=False),
+           envelope(executor, tuple(args), summary, result, message))
+
+    executor = "executors.python.execute"
+    params = {"a": 1, "b": "x"}
+    message = "Script executed successfully!"
+    yield ("python script, small output", legacy(executor, args, params, {"output": "done"}, message),
+           envelope(executor, tuple(args), params, {"output": "done"}, message))
+
+
+def main():
+    print(f"{'case':<30} {'json before':>12} {'json after':>11} {'pickle before':>14} {'pickle after':>13} {'saved':>7}")
+    for name, before, after in cases():
+        json_before = len(json.dumps(before, separators=(",", ":")))
+        json_after = len(json.dumps(after, separators=(",", ":")))
+        pickle_before = len(pickle.dumps(before))
+        pickle_after = len(pickle.dumps(after))
+        saved = 1 - (json_after / json_before)
+        print(f"{name:<30} {json_before:>12} {json_after:>11} {pickle_before:>14} {pickle_after:>13} {saved:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
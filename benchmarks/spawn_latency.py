@@ -0,0 +1,65 @@
+# spawn_latency.py
+#
+# Compares the latency of launching a short script from a large process with subprocess
+# (fork/exec of the whole process) against the executors' spawner process (posix_spawn from a
+# small launcher). The heap is inflated first to mimic a worker with the Flask app, models and
+# blueprints loaded, and gevent is patched in like in the --pool=gevent worker (gevent's
+# subprocess forks the full process rather than using vfork).
+#
+# Usage:
+#     python benchmarks/spawn_latency.py [runs] [heap_mb]
+from gevent import monkey
+monkey.patch_all()
+
+import os
+import sys
+import time
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executors.spawner import Spawner
+
+COMMAND = ["/bin/sh", "-c", "echo ok"]
+
+
+def timed(launch, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = launch()
+        process.stdout.read()
+        process.stderr.read()
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    heap_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+
+    # Many small objects, so the pages are really mapped and touched like a real worker heap
+    ballast = [bytearray(4096) for _ in range(heap_mb * 256)]
+
+    spawner = Spawner.start()
+    try:
+        results = {
+            "subprocess.Popen": timed(lambda: subprocess.Popen(COMMAND, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE), runs),
+            "spawner": timed(lambda: spawner.spawn(COMMAND), runs),
+        }
+    finally:
+        spawner.stop()
+
+    print(f"{runs} launches of {' '.join(COMMAND)!r} from a process with ~{heap_mb} MB heap")
+    for label, (mean, p50, p99) in results.items():
+        print(f"{label:>18}: mean {mean:.2f} ms  p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+    del ballast
+
+
+if __name__ == "__main__":
+    main()
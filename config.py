@@ -6,6 +6,7 @@ import psycopg2                  # Import psycopg2 to connect with PostgreSQL da
 import os                        # Import os for environment variable handling
 from dotenv import load_dotenv   # Import load_dotenv to load environment variables from a .env file
 import ssl
+import json
 from datetime import timedelta
 
 
@@ -27,6 +28,35 @@ load_dotenv()  # This loads the variables defined in the .env file into the envi
 redis_url = os.environ.get("MESSAGE_BROKER")         # Redis URL for Celery's message broker
 database_url = os.environ.get("DATABASE_URL")   # PostgreSQL URL for Celery's result backend
 
+# 'db' stores results in PostgreSQL (celery_taskmeta); 'redis' keeps them in Redis for result_ttl
+# seconds and streams completions to executors/result_persister.py for def_async_task_requests
+result_backend = os.environ.get("RESULT_BACKEND", "db").strip().lower()
+result_ttl = int(os.environ.get("RESULT_TTL", "86400"))  # seconds a result stays readable in the backend
+
+# Each executor gets its own queue so CPU-bound scripts, HTTP calls and database work no longer
+# compete for the same worker slots; see the worker profiles in README.md. Keys are task names or
+# globs (fan-out subtasks follow their executor). TASK_ROUTES (JSON, {"<task or glob>": "<queue>"})
+# overrides or extends the defaults; a task definition's queue_name overrides both per task.
+# sql_export belongs on a prefork worker: exports only use COPY outside gevent.
+task_routing_enabled = os.environ.get("TASK_ROUTING_ENABLED", "N").upper() in ("Y", "YES", "TRUE", "1")
+default_task_routes = {
+    "executors.python.*": "python",
+    "executors.bash.*": "bash",
+    "executors.http.*": "http",
+    "executors.stored_procedure.*": "stored_procedure",
+    "executors.stored_function.*": "stored_function",
+    "executors.sql_export.*": "sql_export",
+}
+
+
+def task_routes():
+    """Celery task_routes from the defaults and TASK_ROUTES; {} (everything on 'celery') when routing is off."""
+    if not task_routing_enabled:
+        return {}
+    routes = dict(default_task_routes)
+    routes.update(json.loads(os.environ.get("TASK_ROUTES") or "{}"))
+    return {pattern: {"queue": queue} for pattern, queue in routes.items() if queue}
+
 
 def parse_expiry(value):
     try:
@@ -96,14 +126,19 @@ def create_app() -> Flask:
     app.config.from_mapping(
         CELERY=dict(
             broker_url=redis_url,                      # Redis as the message broker
-            result_backend="db+"+database_url,              # PostgreSQL as the result backend
+            result_backend=redis_url if result_backend == "redis" else "db+"+database_url,  # Redis (hot, TTL) or PostgreSQL as the result backend
             #result_backend=database_url,              # PostgreSQL as the result backend
+            result_expires=result_ttl,                # Expire stored results after RESULT_TTL seconds
+            task_routes=task_routes(),                # Executor -> queue (TASK_ROUTING_ENABLED)
             beat_scheduler='redbeat.RedBeatScheduler',# RedBeat scheduler for periodic tasks
             redbeat_redis_url=redis_url,              # Redis URL for RedBeat configuration
             redbeat_lock_timeout=300,
             broker_use_ssl = {
                 'ssl_cert_reqs': ssl.CERT_NONE  # or ssl.CERT_REQUIRED if you have proper certs
             },
+            redis_backend_use_ssl = {
+                'ssl_cert_reqs': ssl.CERT_NONE  # same TLS settings as the broker when results live in Redis
+            },
             timezone='UTC',                           # Use UTC timezone for tasks
             enable_utc=True                          # Enable UTC mode
         ),
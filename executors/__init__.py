@@ -7,7 +7,10 @@ from .bash import execute as bash_script
 from .stored_procedure import execute as execute_procedure
 from .stored_function import execute as execute_function
 from .http import execute as http_request
+from .sql_export import execute as sql_export
 from .extensions import db
+from . import metrics  # queue wait / run time / result size histograms, served by api/metrics.py
+from . import result_stream  # streams completions to the result persister when RESULT_BACKEND=redis
 
 load_dotenv()
 # # Define the path where the .env file is stored
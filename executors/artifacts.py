@@ -0,0 +1,83 @@
+import os
+import gzip
+import uuid
+import hashlib
+import tempfile
+from datetime import datetime
+
+# Local artifact store for task outputs too large to keep inline in the task result
+ARTIFACT_PATH = os.getenv("ARTIFACT_PATH", os.path.join(tempfile.gettempdir(), "executor_artifacts"))
+
+
+class ArtifactWriter:
+    """
+    Spool a task output to disk in chunks, hashing it on the way.
+
+    Data is written to a hidden temp file under ARTIFACT_PATH and only moved to its final
+    name by commit(), so readers never see partial artifacts. With compress=True the file is
+    gzip-compressed; size and sha256 always describe the uncompressed content. Used as a
+    context manager the spool file is removed if the block raises before commit().
+    """
+
+    def __init__(self, kind, suffix="", compress=False):
+        day = datetime.utcnow().strftime("%Y/%m/%d")
+        self.name = f"{kind}/{day}/{kind}-{uuid.uuid4().hex}{suffix}{'.gz' if compress else ''}"
+        self.path = os.path.join(ARTIFACT_PATH, self.name)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._spool = tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path), prefix=".spool-", delete=False)
+        self._file = gzip.GzipFile(fileobj=self._spool, mode="wb", compresslevel=6) if compress else self._spool
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._sha256.update(data)
+        self.size += len(data)
+        self._file.write(data)
+        return len(data)
+
+    def commit(self):
+        """Finish the file and return its reference: {"artifact", "size", "stored_size", "sha256"}."""
+        if self._file is not self._spool:
+            self._file.close()
+        self._spool.close()
+        stored_size = os.path.getsize(self._spool.name)
+        os.replace(self._spool.name, self.path)
+        self.committed = True
+        return {
+            "artifact": self.name,
+            "size": self.size,
+            "stored_size": stored_size,
+            "sha256": self._sha256.hexdigest(),
+        }
+
+    def discard(self):
+        try:
+            if self._file is not self._spool:
+                self._file.close()
+            self._spool.close()
+        finally:
+            try:
+                os.unlink(self._spool.name)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.committed:
+            self.discard()
+        return False
+
+
+def artifact_path(name):
+    """Absolute path of a stored artifact reference, refusing names that escape ARTIFACT_PATH."""
+    root = os.path.realpath(ARTIFACT_PATH)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Invalid artifact name: {name}")
+    return path
@@ -1,19 +1,18 @@
-import subprocess
+import threading
 import os
 import json
 from celery import shared_task
+from .output_stream import OutputCollector
+from .spawner import spawn_process
+from .envelope import envelope
+from .run_limits import run_limited
 
 script_path = os.getenv("SCRIPT_PATH_02")  # Base directory for scripts
 
 @shared_task(bind=True)
+@run_limited()
 def execute(self, *args, **kwargs):
     script_name = args[0] if len(args) > 0 else None
-    user_task_name = args[1] if len(args) > 1 else None
-    task_name = args[2] if len(args) > 2 else None
-    user_schedule_name = args[3] if len(args) > 3 else None
-    redbeat_schedule_name = args[4] if len(args) > 4 else None
-    schedule_type = args[5] if len(args) > 5 else None
-    schedule = args[6] if len(args) > 6 else None
 
     full_script_path = os.path.join(script_path, script_name)
 
@@ -25,46 +24,49 @@ def execute(self, *args, **kwargs):
     if not os.access(full_script_path, os.X_OK):
         return {"error": f"Permission denied: '{full_script_path}' is not executable"}
 
+    collector = OutputCollector(self.request.id)
+    process = None
+
     try:
-        # Execute the shell script and capture output
-        result = subprocess.run(
-            [full_script_path] + [str(arg) for arg in args[6:]],  # Pass additional arguments to the script
-            text=True,
-            capture_output=True,
-            check=True
+        # Execute the shell script, streaming its output instead of buffering all of it
+        # (launched through the worker's spawner process when it is running, so the worker itself isn't forked)
+        process = spawn_process(
+            [full_script_path] + [str(arg) for arg in args[6:]]  # Pass additional arguments to the script
         )
 
+        stderr_reader = threading.Thread(target=collector.consume, args=("stderr", process.stderr), daemon=True)
+        stderr_reader.start()
+        collector.consume("stdout", process.stdout)
+        stderr_reader.join()
+        process.stdout.close()
+        process.stderr.close()
+        returncode = process.wait()
+        collector.close()
 
-
-
+        if returncode != 0:
+            return {
+                "error": f"Shell script execution failed: {returncode}",
+                "stderr": collector.text("stderr") or "No error output",
+                "stdout": collector.text("stdout") or "No output",
+                "output_stats": collector.summary()
+            }
 
         # Try parsing the output as JSON
+        stdout_text = collector.text("stdout")
         try:
-            output_json = json.loads(result.stdout.strip())
+            output_json = json.loads(stdout_text)
         except json.JSONDecodeError:
-            output_json = {"output": result.stdout.strip()}  # Fallback if not valid JSON
+            output_json = {"output": stdout_text}  # Fallback if not valid JSON (or only the tail was kept)
 
-        return {
-            "user_task_name": user_task_name,
-            "task_name": task_name,
-            "executor": self.name,
-            "user_schedule_name": user_schedule_name,
-            "redbeat_schedule_name": redbeat_schedule_name,
-            "schedule_type":schedule_type,
-            "schedule": schedule,
-            "args": args,
-            "kwargs": kwargs,
-            "parameters": kwargs,
-            "result": output_json,  # Return parsed JSON output
-            "message": "Shell script executed successfully!"
-        }
-
-    except subprocess.CalledProcessError as e:
-        return {
-            "error": f"Shell script execution failed: {e.returncode}",
-            "stderr": e.stderr.strip() if e.stderr else "No error output",
-            "stdout": e.stdout.strip() if e.stdout else "No output"
-        }
+        return envelope(self.name, args, kwargs, output_json, "Shell script executed successfully!",
+                        output_stats=collector.summary())
 
     except Exception as e:
+        collector.close()
         return {"error": f"Unexpected error: {str(e)}"}
+
+    finally:
+        # Streaming failed before the script exited: don't leave it running (subprocess.run killed it too)
+        if process is not None and process.returncode is None:
+            process.kill()
+            process.wait()
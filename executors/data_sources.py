@@ -0,0 +1,49 @@
+import os
+import re
+import time
+import threading
+
+from .models import DefDataSource
+
+DATA_SOURCE_NAME_TTL = float(os.getenv("DATA_SOURCE_NAME_TTL", "60"))  # seconds a looked-up data source name is reused
+
+_names = {}  # def_data_source_id -> (fetched_at, datasource_name or None)
+_names_lock = threading.Lock()
+
+
+def data_source_env_var(datasource_name, prefix="DATASOURCE_URL_"):
+    """Environment variable holding a data source setting, e.g. 'HR Prod' -> DATASOURCE_URL_HR_PROD."""
+    return prefix + re.sub(r"[^A-Z0-9]+", "_", datasource_name.upper()).strip("_")
+
+
+def data_source_name(def_data_source_id):
+    """datasource_name of a registered data source (None if it does not exist), cached for DATA_SOURCE_NAME_TTL seconds."""
+    now = time.monotonic()
+    with _names_lock:
+        cached = _names.get(def_data_source_id)
+    if cached is not None and now - cached[0] < DATA_SOURCE_NAME_TTL:
+        return cached[1]
+
+    data_source = DefDataSource.query.filter_by(def_data_source_id=def_data_source_id).first()
+    name = data_source.datasource_name if data_source else None
+    with _names_lock:
+        _names[def_data_source_id] = (now, name)
+    return name
+
+
+def data_source_dsn(def_data_source_id):
+    """
+    Connection URL of a data source registered in def_data_sources.
+
+    Credentials are not stored in the table: the URL is read from the data source's
+    DATASOURCE_URL_<NAME> environment variable. Must be called inside the Flask app context.
+    """
+    data_source = DefDataSource.query.filter_by(def_data_source_id=def_data_source_id).first()
+    if data_source is None:
+        raise ValueError(f"Data source {def_data_source_id} does not exist.")
+
+    env_var = data_source_env_var(data_source.datasource_name or "")
+    dsn = os.getenv(env_var)
+    if not dsn:
+        raise ValueError(f"No connection URL configured for data source '{data_source.datasource_name}' (set {env_var}).")
+    return dsn
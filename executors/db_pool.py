@@ -0,0 +1,426 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from celery.signals import worker_init, worker_process_init, worker_shutdown
+from celery.worker.control import inspect_command
+
+from .green import configure_wait_callback
+from .statement_cache import PreparedConnection, statement_cache_stats
+from .data_sources import data_source_dsn
+
+logging.basicConfig(level=logging.INFO)
+
+db_url = os.getenv("DATABASE_URL")
+
+# Pool settings, all optional. DB_POOL_MAX_SIZE defaults to the worker concurrency.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = os.getenv("DB_POOL_MAX_SIZE")
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))                              # seconds to wait for a free connection
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))  # ping connections idle longer than this
+DB_MAX_CONNECTIONS = os.getenv("DB_MAX_CONNECTIONS")                     # open connections per worker process across all data sources (default: 2 x pool size)
+DB_MAX_POOLS = int(os.getenv("DB_MAX_POOLS", "20"))                      # data source pools kept per worker process
+DB_POOL_IDLE_SECONDS = float(os.getenv("DB_POOL_IDLE_SECONDS", "300"))   # close data source pools unused for this long
+DB_POOL_EVICTION_INTERVAL = 30.0
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the timeout."""
+
+
+class ConnectionBudget:
+    """
+    Cap on the connections open across every pool of a worker process. A pool that is below its own
+    max_size but out of budget asks the reclaimer (the pool registry) to close idle connections of
+    other pools before it waits.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        self.reclaimer = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.limit is None or self.used < self.limit:
+                self.used += 1
+                return True
+            return False
+
+    def release(self, count=1):
+        with self._lock:
+            self.used -= count
+
+    def reclaim(self, requester):
+        return self.reclaimer(requester) if self.reclaimer is not None else False
+
+    def stats(self):
+        with self._lock:
+            return {"limit": self.limit, "used": self.used}
+
+
+class ConnectionPool:
+    """
+    A bounded pool of psycopg2 connections shared by the database executors of one worker process.
+
+    Idle connections are reused (a hit), new ones are opened while the pool is below max_size
+    (a miss), otherwise the caller waits for a connection to be returned (a wait). Connections
+    that sat idle longer than health_check_interval are pinged before being handed out.
+    Every open connection also counts against the budget shared with the worker's other pools.
+    Once closed, connections still checked out (or handed out to a caller that looked the pool up
+    just before) are closed when returned instead of going back to the idle list.
+    """
+
+    def __init__(self, dsn, max_size, min_size=1, timeout=DB_POOL_TIMEOUT,
+                 health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL, budget=None):
+        self.dsn = dsn
+        self.budget = budget or ConnectionBudget()
+        self.max_size = max(1, int(max_size))
+        self.min_size = max(0, min(int(min_size), self.max_size))
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = []   # (connection, last_used) pairs, most recently used last
+        self._size = 0    # open connections, idle and checked out
+        self._cond = threading.Condition()
+        self.closed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.discarded = 0
+
+        for _ in range(self.min_size):
+            if not self.budget.acquire():
+                break
+            try:
+                self._idle.append((self._connect(), time.monotonic()))
+                self._size += 1
+            except psycopg2.Error as e:
+                self.budget.release()
+                logging.error(f"Failed to pre-open pooled connection: {e}")
+                break
+
+    def _connect(self):
+        # Pooled connections live long enough for their prepared statements to pay off
+        return psycopg2.connect(self.dsn, connection_factory=PreparedConnection)
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            logging.error(f"Failed to close pooled connection: {e}", exc_info=True)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        waited_since = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size and self.budget.acquire():
+                    conn, last_used = None, None
+                    self._size += 1
+                    break
+
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    self.waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.wait_time += time.monotonic() - waited_since
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s (max_size={self.max_size}).")
+
+                if self._size < self.max_size:
+                    # Out of process-wide budget: free idle connections of other pools (outside our
+                    # lock, they take theirs) or poll, since their releases do not notify this pool
+                    self._cond.release()
+                    try:
+                        reclaimed = self.budget.reclaim(self)
+                    finally:
+                        self._cond.acquire()
+                    if not reclaimed:
+                        self._cond.wait(min(remaining, 0.05))
+                else:
+                    self._cond.wait(remaining)
+
+            if waited_since is not None:
+                self.wait_time += time.monotonic() - waited_since
+
+        if conn is not None:
+            if self._is_healthy(conn, last_used):
+                with self._cond:
+                    self.hits += 1
+                return conn
+            # Stale connection: drop it and reuse its slot for a fresh one
+            self._close(conn)
+            with self._cond:
+                self.discarded += 1
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            self.budget.release()
+            raise
+
+        with self._cond:
+            self.misses += 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        if discard or conn.closed or self.closed:
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+                self.discarded += 1
+                self._cond.notify()
+            self.budget.release()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, discard=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def close_idle(self, limit=None):
+        """Close up to limit idle connections, least recently used first; returns how many were closed."""
+        with self._cond:
+            count = len(self._idle) if limit is None else min(limit, len(self._idle))
+            closing, self._idle = self._idle[:count], self._idle[count:]
+            self._size -= count
+            self._cond.notify_all()
+        for conn, _ in closing:
+            self._close(conn)
+        self.budget.release(count)
+        return count
+
+    def closeall(self):
+        self.closed = True
+        self.close_idle()
+
+    def close_if_unused(self):
+        """Close the pool unless a connection is checked out; the check and the close are atomic."""
+        with self._cond:
+            if self._size > len(self._idle):
+                return False
+            # From here on returned connections are closed, so a getconn that races the close
+            # below cannot leave a connection (or its budget unit) behind in the dropped pool
+            self.closed = True
+        self.close_idle()
+        return True
+
+    def in_use(self):
+        with self._cond:
+            return self._size - len(self._idle)
+
+    def stats(self):
+        with self._cond:
+            lookups = self.hits + self.misses
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 6),
+                "discarded": self.discarded,
+            }
+
+
+class PoolRegistry:
+    """
+    The connection pools of a worker process, one per data source (None is DATABASE_URL).
+
+    Pools are created on first use and share one ConnectionBudget. Beyond max_pools the least
+    recently used pool with no connection checked out is closed, and pools unused for idle_seconds
+    are closed as well, so a worker serving many databases holds connections only to the busy ones.
+    """
+
+    def __init__(self, budget, pool_size=1, max_pools=DB_MAX_POOLS, idle_seconds=DB_POOL_IDLE_SECONDS):
+        self.budget = budget
+        self.budget.reclaimer = self.reclaim
+        self.pool_size = pool_size
+        self.max_pools = max(1, max_pools)
+        self.idle_seconds = idle_seconds
+        self._pools = OrderedDict()   # data source -> [pool, last_used], least recently used first
+        self._lock = threading.Lock()
+        self._last_eviction = time.monotonic()
+        self.evicted = 0
+
+    def get(self, key, dsn_factory, min_size=0):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_eviction >= DB_POOL_EVICTION_INTERVAL:
+                self._evict(lambda pool, last_used: now - last_used > self.idle_seconds)
+                self._last_eviction = now
+            entry = self._pools.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._pools.move_to_end(key)
+                return entry[0]
+
+        dsn = dsn_factory()  # may query def_data_sources, so outside the lock
+
+        with self._lock:
+            entry = self._pools.get(key)
+            if entry is not None:
+                return entry[0]
+            if len(self._pools) >= self.max_pools:
+                self._evict(lambda pool, last_used: True, limit=len(self._pools) - self.max_pools + 1)
+            pool = ConnectionPool(dsn, max_size=self.pool_size, min_size=min_size, budget=self.budget)
+            self._pools[key] = [pool, now]
+            logging.info(f"Database connection pool for data source {key} created (max_size={pool.max_size}).")
+            return pool
+
+    def _evict(self, should_evict, limit=None):
+        """Close pools (oldest first) matching should_evict that have nothing checked out."""
+        for key, (pool, last_used) in list(self._pools.items()):
+            if limit is not None and limit <= 0:
+                break
+            if should_evict(pool, last_used) and pool.close_if_unused():
+                del self._pools[key]
+                self.evicted += 1
+                if limit is not None:
+                    limit -= 1
+
+    def reclaim(self, requester):
+        """Close one idle connection of another pool, least recently used pool first."""
+        with self._lock:
+            pools = [pool for pool, _ in self._pools.values() if pool is not requester]
+        return any(pool.close_idle(1) for pool in pools)
+
+    def close_all(self):
+        with self._lock:
+            pools, self._pools = self._pools, OrderedDict()
+        for pool, _ in pools.values():
+            pool.closeall()
+
+    def pools(self):
+        with self._lock:
+            return {key: pool for key, (pool, _) in self._pools.items()}
+
+
+_budget = ConnectionBudget(int(DB_MAX_CONNECTIONS) if DB_MAX_CONNECTIONS else 2 * int(DB_POOL_MAX_SIZE or 1))
+_registry = PoolRegistry(_budget, pool_size=int(DB_POOL_MAX_SIZE or 1))
+_registry_lock = threading.Lock()
+
+
+def init_pool(max_size=None, dsn=None):
+    """Reset the worker's pools and open the DATABASE_URL pool. DB_POOL_MAX_SIZE, when set, overrides max_size."""
+    size = int(DB_POOL_MAX_SIZE) if DB_POOL_MAX_SIZE else (max_size or 1)
+    with _registry_lock:
+        _registry.close_all()
+        _registry.pool_size = size
+        _budget.limit = int(DB_MAX_CONNECTIONS) if DB_MAX_CONNECTIONS else 2 * size
+        pool = _registry.get(None, lambda: dsn or db_url, min_size=DB_POOL_MIN_SIZE)
+        logging.info(f"Database connection pool initialized (max_size={pool.max_size}).")
+        return pool
+
+
+def get_pool(def_data_source_id=None):
+    """
+    Return the worker's pool for a data source registered in def_data_sources, or for
+    DATABASE_URL when def_data_source_id is None, creating it on first use.
+    """
+    if def_data_source_id is None:
+        return _registry.get(None, lambda: db_url)
+    return _registry.get(def_data_source_id, lambda: data_source_dsn(def_data_source_id))
+
+
+def close_pool():
+    with _registry_lock:
+        _registry.close_all()
+
+
+def worker_pool_name(worker):
+    """Normalized name of a worker's execution pool: 'prefork', 'gevent', 'eventlet', 'solo', 'thread'."""
+    pool_cls = getattr(worker, "pool_cls", None)
+    if isinstance(pool_cls, str):
+        name = pool_cls.lower()
+    else:
+        name = getattr(pool_cls, "__module__", "").rsplit(".", 1)[-1]
+    return {"processes": "prefork", "threads": "thread"}.get(name, name)
+
+
+@worker_init.connect
+def _init_pool_on_worker_start(sender=None, **kwargs):
+    # Prefork children each run one task at a time and must not inherit the
+    # parent's sockets, so they get their own pool in worker_process_init.
+    pool_name = worker_pool_name(sender)
+    if pool_name == "prefork":
+        return
+    configure_wait_callback(pool_name)
+    init_pool(max_size=getattr(sender, "concurrency", None) or os.cpu_count())
+
+
+@worker_process_init.connect
+def _init_pool_on_child_start(**kwargs):
+    init_pool(max_size=1)
+
+
+@worker_shutdown.connect
+def _close_pool_on_worker_stop(**kwargs):
+    close_pool()
+
+
+@inspect_command()
+def db_pool_stats(state):
+    """Pool hit/miss/wait and prepared statement counters: celery -A executors inspect db_pool_stats"""
+    pools = _registry.pools()
+    stats = pools.pop(None).stats() if None in pools else {}
+    stats["prepared_statements"] = statement_cache_stats()
+    stats["connections"] = _budget.stats()
+    stats["data_sources"] = {str(key): pool.stats() for key, pool in pools.items()}
+    stats["data_source_pools_evicted"] = _registry.evicted
+    return stats
@@ -0,0 +1,56 @@
+import os
+import json
+import zlib
+import base64
+
+RESULT_ENVELOPE_VERSION = 1
+RESULT_COMPRESS_THRESHOLD = int(os.getenv("RESULT_COMPRESS_THRESHOLD", "8192"))  # bytes of JSON above which a payload is compressed
+PACKED_ENCODING = "zlib+base64"
+
+
+def pack(value, threshold=RESULT_COMPRESS_THRESHOLD):
+    """
+    Return value unchanged if its JSON fits in threshold bytes, otherwise a
+    {"packed": "zlib+base64", "size": ..., "data": ...} stand-in (see unpack()).
+    """
+    if value is None:
+        return None
+    data = json.dumps(value, default=str, separators=(",", ":")).encode("utf-8")
+    if len(data) <= threshold:
+        return value
+    return {
+        "packed": PACKED_ENCODING,
+        "size": len(data),
+        "data": base64.b64encode(zlib.compress(data, 6)).decode("ascii"),
+    }
+
+
+def unpack(value):
+    """Inverse of pack(); any other value is returned as is."""
+    if isinstance(value, dict) and value.get("packed") == PACKED_ENCODING and "data" in value:
+        return json.loads(zlib.decompress(base64.b64decode(value["data"])))
+    return value
+
+
+def envelope(executor, args, kwargs, result, message, **extra):
+    """
+    The result every executor returns on success, stored as-is by the result backend.
+
+    The schedule is referenced by redbeat_schedule_name rather than copied, args[0] (the script,
+    routine or query run) is kept as 'target', and the parameters appear once, as 'kwargs'.
+    kwargs and result are compressed with pack() when large. 'v' is bumped on incompatible changes.
+    """
+    return {
+        "v": RESULT_ENVELOPE_VERSION,
+        "user_task_name": args[1] if len(args) > 1 else None,
+        "task_name": args[2] if len(args) > 2 else None,
+        "executor": executor,
+        "user_schedule_name": args[3] if len(args) > 3 else None,
+        "redbeat_schedule_name": args[4] if len(args) > 4 else None,
+        "schedule_type": args[5] if len(args) > 5 else None,
+        "target": args[0] if len(args) > 0 else None,
+        "kwargs": pack(kwargs or None),
+        **extra,
+        "result": pack(result),
+        "message": message,
+    }
@@ -0,0 +1,50 @@
+import os
+import logging
+
+import psycopg2
+from psycopg2 import extensions
+from gevent.socket import wait_read, wait_write
+
+logging.basicConfig(level=logging.INFO)
+
+# auto: enable only when the worker runs on the gevent pool; on/off: force it either way
+PG_GEVENT_WAIT_CALLBACK = os.getenv("PG_GEVENT_WAIT_CALLBACK", "auto").lower()
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """
+    psycopg2 wait callback that yields to the gevent hub while the server is busy,
+    so one slow query no longer blocks every other greenlet in the worker.
+    """
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state}")
+
+
+def enable_wait_callback():
+    extensions.set_wait_callback(gevent_wait_callback)
+    logging.info("psycopg2 gevent wait callback enabled.")
+
+
+def disable_wait_callback():
+    extensions.set_wait_callback(None)
+
+
+def is_green():
+    """True when psycopg2 runs in cooperative mode. COPY is not available in this mode."""
+    return extensions.get_wait_callback() is gevent_wait_callback
+
+
+def configure_wait_callback(pool_name):
+    """Called on worker start, before any pooled connection is opened."""
+    if PG_GEVENT_WAIT_CALLBACK in ("off", "false", "0", "n"):
+        return
+    if PG_GEVENT_WAIT_CALLBACK in ("on", "true", "1", "y") or pool_name == "gevent":
+        enable_wait_callback()
@@ -1,78 +1,293 @@
+import os
+import json
+import time
+import random
+import hashlib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from celery import shared_task
+from .http_sessions import http_sessions
+from .artifacts import ArtifactWriter, artifact_path
+from .http_limiter import host_slot
+from .http_breaker import CircuitOpen
+from .task_definitions import get_task_definition
+from .envelope import envelope
+from . import http_cache, http_breaker
+from .run_limits import run_limited, deferrals
 
-@shared_task(bind=True)
-def execute(self, *args, **kwargs):
-    script_name = args[0] if len(args) > 0 else None  # Will be None for HTTP executor
-    user_task_name = args[1] if len(args) > 1 else None
-    task_name = args[2] if len(args) > 2 else None
-    user_schedule_name = args[3] if len(args) > 3 else None
-    redbeat_schedule_name = args[4] if len(args) > 4 else None
-    schedule_type = args[5] if len(args) > 5 else None
-    schedule = args[6] if len(args) > 6 else None
+HTTP_BATCH_CONCURRENCY = int(os.getenv("HTTP_BATCH_CONCURRENCY", "20"))  # default in-flight requests for a batch task
+HTTP_INLINE_RESULT_LIMIT = int(os.getenv("HTTP_INLINE_RESULT_LIMIT", str(256 * 1024)))  # larger bodies go to the artifact store
+HTTP_BATCH_INLINE_RESULT_LIMIT = int(os.getenv("HTTP_BATCH_INLINE_RESULT_LIMIT", str(16 * 1024)))  # same, per response of a batch
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))  # seconds to establish a connection
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT")) if os.getenv("HTTP_READ_TIMEOUT") else None  # default: wait indefinitely
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))            # retry budget for tasks whose definition sets none
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "2"))      # base delay (s), doubled on each attempt
+HTTP_RETRY_BACKOFF_MAX = float(os.getenv("HTTP_RETRY_BACKOFF_MAX", "300"))
+HTTP_CHUNK_SIZE = 64 * 1024
+SUPPORTED_METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+IDEMPOTENT_METHODS = ['GET', 'PUT', 'DELETE']
+RETRYABLE_STATUS_CODES = [429, 502, 503, 504]
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, CircuitOpen)
+UNSENT_EXCEPTIONS = (requests.ConnectTimeout, CircuitOpen)  # the request never reached the host
+
+
+def prepare_request(spec):
+    """
+    Split one request spec into (url, method, headers, payload).
 
-    url = kwargs.pop('url', None)
+    'url', 'method' and 'headers' are reserved keys; everything else is sent as query params
+    (GET) or JSON body. Raises ValueError with a user-facing message if the spec is invalid.
+    """
+    spec = dict(spec)
+
+    url = spec.pop('url', None)
     if not url:
-        return {"error": "Missing 'url' in parameters."}
+        raise ValueError("Missing 'url' in parameters.")
 
-    method = kwargs.pop('method', None)
+    method = spec.pop('method', None)
     if not method:
-        return {"error": "Missing HTTP 'method'. Please specify 'method' in parameters (e.g., GET, POST, PUT, DELETE)."}
+        raise ValueError("Missing HTTP 'method'. Please specify 'method' in parameters (e.g., GET, POST, PUT, DELETE).")
     method = method.upper()
+    if method not in SUPPORTED_METHODS:
+        raise ValueError(f"Unsupported HTTP method: {method}")
 
-    headers = kwargs.pop('headers', None)
+    headers = spec.pop('headers', None)
     # Set default headers only for POST and PUT if headers not provided
     if not headers and method in ['POST', 'PUT']:
         headers = {'Content-Type': 'application/json'}
 
-    payload = kwargs  # Remaining kwargs are used as request body or query params
+    return url, method, headers, spec  # Remaining keys are used as request body or query params
+
+
+def retry_policy(task_name):
+    """(max_retries, backoff_seconds) from the task definition, falling back to the HTTP_* defaults."""
+    definition = get_task_definition(task_name) or {}
+    max_retries = definition.get("max_retries")
+    backoff = definition.get("retry_backoff")
+    return (HTTP_MAX_RETRIES if max_retries is None else max_retries,
+            HTTP_RETRY_BACKOFF if backoff is None else backoff)
+
+
+def retry_countdown(attempt, backoff, not_before=0):
+    """Exponential backoff with jitter: a random delay in [d/2, d] where d = backoff * 2**attempt."""
+    delay = min(HTTP_RETRY_BACKOFF_MAX, backoff * (2 ** attempt))
+    return max(not_before, random.uniform(delay / 2, delay))
+
+
+def retry_after_header(response):
+    try:
+        return min(HTTP_RETRY_BACKOFF_MAX, float(response.headers.get('Retry-After') or 0))
+    except ValueError:
+        return 0  # HTTP-date form is not worth parsing here
+
+
+def send_request(url, method, headers, payload):
+    """Send the request with a streamed body; the caller must read it with decode_response()."""
+    session = http_sessions.get(url)  # Keep-alive session shared by all runs against this host
+    timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+    if method == 'GET':
+        if payload:
+            return session.get(url, headers=headers, params=payload, stream=True, timeout=timeout)
+        return session.get(url, headers=headers, stream=True, timeout=timeout)
+    elif method == 'POST':
+        return session.post(url, headers=headers, json=payload, stream=True, timeout=timeout)
+    elif method == 'PUT':
+        return session.put(url, headers=headers, json=payload, stream=True, timeout=timeout)
+    return session.delete(url, headers=headers, json=payload, stream=True, timeout=timeout)
+
+
+@contextmanager
+def guarded_request(url, method, headers, payload):
+    """
+    Send the request through the host's circuit breaker and adaptive concurrency slot and yield
+    the streamed response; the slot is held until the block exits. Raises CircuitOpen without
+    sending anything while the host is considered down. Connection errors, timeouts and 5xx
+    responses count as breaker failures; other exceptions propagate without touching the breaker.
+    """
+    http_breaker.check(url)
+    with host_slot(url) as slot:
+        try:
+            response = send_request(url, method, headers, payload)
+        # Anything else (invalid URL or headers, unserializable payload) is our fault, not the host's
+        except (requests.ConnectionError, requests.Timeout):
+            http_breaker.record(url, False)
+            raise
+        slot.record(response.status_code)
+        http_breaker.record(url, response.status_code < 500)
+        yield response
+
+
+def read_body(response, inline_limit=HTTP_INLINE_RESULT_LIMIT):
+    """
+    Read the response body chunk by chunk. Returns (body_bytes, None, sha256) when it fits within
+    inline_limit, otherwise (None, artifact_ref, sha256) with the body spooled to the artifact store.
+    """
+    buffer = bytearray()
+    writer = None
+    try:
+        for chunk in response.iter_content(HTTP_CHUNK_SIZE):
+            if writer is None and len(buffer) + len(chunk) <= inline_limit:
+                buffer += chunk
+                continue
+            if writer is None:
+                writer = ArtifactWriter("http")
+                writer.write(bytes(buffer))
+                buffer = None
+            writer.write(chunk)
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+
+    if writer is None:
+        return bytes(buffer), None, hashlib.sha256(buffer).hexdigest()
+    artifact = writer.commit()
+    return None, artifact, artifact["sha256"]
+
+
+def decode_response(response, inline_limit=HTTP_INLINE_RESULT_LIMIT):
+    """
+    Read and release the response; returns (result_data, body_sha256).
+    Small bodies are decoded inline, large ones become an artifact reference.
+    """
+    with response:
+        body, artifact, sha256 = read_body(response, inline_limit)
+
+    if artifact is not None:
+        artifact["content_type"] = response.headers.get('Content-Type')
+        return {"artifact": artifact}, sha256
+
+    # Try to decode JSON, fallback to raw text
+    try:
+        return json.loads(body), sha256
+    except ValueError:
+        return {"response_text": body.decode(response.encoding or 'utf-8', errors='replace')}, sha256
+
+
+def run_batch(specs, concurrency=HTTP_BATCH_CONCURRENCY):
+    """
+    Send every spec with at most `concurrency` requests in flight and return one result per
+    spec, in input order. Failures are reported per item and never abort the batch.
+    Under the gevent worker pool the pool threads are greenlets.
+    """
+    def run_one(index, spec):
+        started = time.perf_counter()
+        item = {"index": index, "url": spec.get('url') if isinstance(spec, dict) else None}
+        try:
+            if not isinstance(spec, dict):
+                raise ValueError("Each request spec must be an object.")
+            url, method, headers, payload = prepare_request(spec)
+            item["method"] = method
+            with guarded_request(url, method, headers, payload) as response:
+                item["status_code"] = response.status_code
+                item["result"], _ = decode_response(response, HTTP_BATCH_INLINE_RESULT_LIMIT)
+            item["ok"] = response.ok
+        except Exception as e:
+            item["ok"] = False
+            item["error"] = str(e)
+        item["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return item
+
+    if not specs:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(int(concurrency), len(specs)))) as pool:
+        return list(pool.map(run_one, range(len(specs)), specs))
+
+
+@shared_task(bind=True)
+@run_limited()
+def execute(self, *args, **kwargs):
+    script_name = args[0] if len(args) > 0 else None  # Will be None for HTTP executor
+    task_name = args[2] if len(args) > 2 else None
+    redbeat_schedule_name = args[4] if len(args) > 4 else None
+
+    # Batch mode: {"requests": [{"url": ..., "method": ..., ...}, ...], "concurrency": 20}
+    if 'requests' in kwargs:
+        specs = kwargs.get('requests')
+        if not isinstance(specs, list):
+            return {"error": "'requests' must be a list of request specs."}
+        concurrency = kwargs.get('concurrency') or HTTP_BATCH_CONCURRENCY
+
+        try:
+            started = time.perf_counter()
+            results = run_batch(specs, concurrency)
+            succeeded = sum(1 for item in results if item["ok"])
+
+            result = {
+                "total": len(results),
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                "responses": results
+            }
+            return envelope(self.name, args, kwargs, result, "HTTP batch executed successfully.")
+        except Exception as e:
+            return {"error": f"HTTP batch execution failed: {str(e)}"}
+
+    try:
+        url, method, headers, payload = prepare_request(kwargs)
+    except ValueError as e:
+        return {"error": str(e)}
 
     # Log the request info for debugging
     # print(f"Executing HTTP task: {method} {url}")
     # print(f"Headers: {headers}")
     # print(f"Payload: {payload}")
 
+    retry_in = None  # seconds until the next attempt, when this one should be retried
     try:
-        response = None
+        max_retries, backoff = retry_policy(task_name)
+        deferred = deferrals(self.request)  # requeues by run limits are not attempts
+        attempt = self.request.retries - deferred
+        can_retry = attempt < max_retries
 
-        if method == 'GET':
-            if payload:
-                response = requests.get(url, headers=headers, params=payload)
+        # Repeating GET schedules send the validators of their previous run (If-None-Match / If-Modified-Since)
+        validators = http_cache.load_validators(redbeat_schedule_name) if method == 'GET' else {}
+        if validators:
+            headers = http_cache.conditional_headers(headers, validators)
+
+        with guarded_request(url, method, headers, payload) as response:
+            not_modified = response.status_code == 304 and bool(validators)
+            if can_retry and response.status_code in RETRYABLE_STATUS_CODES and method in IDEMPOTENT_METHODS:
+                retry_in = retry_countdown(attempt, backoff, retry_after_header(response))
+                response.close()
+            elif not_modified:
+                response.close()
             else:
-                response = requests.get(url, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, headers=headers, json=payload)
-        elif method == 'PUT':
-            response = requests.put(url, headers=headers, json=payload)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=headers, json=payload)
-        else:
-            return {"error": f"Unsupported HTTP method: {method}"}
-
-        # Try to decode JSON, fallback to raw text
-        try:
-            result_data = response.json()
-        except ValueError:
-            result_data = {"response_text": response.text}
-
-        # print("result_data:", result_data)
-
-        return {
-            "user_task_name": user_task_name,
-            "task_name": task_name,
-            "executor": self.name,
-            "user_schedule_name": user_schedule_name,
-            "redbeat_schedule_name": redbeat_schedule_name,
-            "schedule_type": schedule_type,
-            "schedule": schedule,
-            "args": args,
-            "kwargs": payload,
-            "url": url,
-            "method": method,
-            "status_code": response.status_code,
-            "result": result_data,
-            "message": "HTTP request executed successfully."
-        }
+                result_data, sha256 = decode_response(response)
+
+        if retry_in is None:
+            if not_modified:
+                http_cache.touch(redbeat_schedule_name)
+                result_data = {"unchanged": True, "sha256": validators.get("sha256"), "changed_at": validators.get("changed_at")}
+            elif method == 'GET' and response.status_code == 200 and redbeat_schedule_name:
+                if validators.get("sha256") == sha256:
+                    # Upstream ignored the validators but sent the same payload again
+                    http_cache.touch(redbeat_schedule_name)
+                    if "artifact" in result_data:
+                        os.remove(artifact_path(result_data["artifact"]["artifact"]))
+                    result_data = {"unchanged": True, "sha256": sha256, "changed_at": validators.get("changed_at")}
+                else:
+                    http_cache.save_validators(redbeat_schedule_name, response, sha256)
 
+            # print("result_data:", result_data)
+
+            return envelope(self.name, args, payload, result_data, "HTTP request executed successfully.",
+                            url=url, method=method, status_code=response.status_code,
+                            attempts=attempt + 1)
+
+    except RETRYABLE_EXCEPTIONS as e:
+        # Read timeouts and connection resets may come after the host got the request, so only
+        # idempotent methods are retried on those; anything is retried when it was never sent.
+        if method not in IDEMPOTENT_METHODS and not isinstance(e, UNSENT_EXCEPTIONS):
+            return {"error": f"HTTP request execution failed: {str(e)}"}
+        if not can_retry:
+            return {"error": f"HTTP request execution failed after {attempt + 1} attempt(s): {str(e)}"}
+        retry_in = retry_countdown(attempt, backoff, getattr(e, 'retry_after', 0))
     except Exception as e:
         return {"error": f"HTTP request execution failed: {str(e)}"}
+
+    # Re-queue the run instead of sleeping in the worker; Celery tracks the attempt count
+    raise self.retry(countdown=retry_in, max_retries=max_retries + deferred)
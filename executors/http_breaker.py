@@ -0,0 +1,105 @@
+import os
+import time
+import logging
+from urllib.parse import urlsplit
+
+from .redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+HTTP_BREAKER_ENABLED = os.getenv("HTTP_BREAKER_ENABLED", "Y").upper() in ("Y", "YES", "TRUE", "1")
+HTTP_BREAKER_FAILURE_THRESHOLD = int(os.getenv("HTTP_BREAKER_FAILURE_THRESHOLD", "5"))  # consecutive failures that open the circuit
+HTTP_BREAKER_FAILURE_WINDOW = int(os.getenv("HTTP_BREAKER_FAILURE_WINDOW", "60"))        # failures further apart than this do not add up
+HTTP_BREAKER_COOLDOWN = float(os.getenv("HTTP_BREAKER_COOLDOWN", "30"))                 # seconds an open circuit rejects requests
+HTTP_BREAKER_PROBE_TIMEOUT = int(os.getenv("HTTP_BREAKER_PROBE_TIMEOUT", "60"))         # half-open probe lease, in case its worker dies
+
+# KEYS: state hash, probe key. ARGV: now, cooldown, probe timeout
+# Returns "0" if the request may go ahead, otherwise the seconds until it is worth trying again.
+_ALLOW = redis_client.register_script("""
+local state = redis.call('HMGET', KEYS[1], 'state', 'opened_at')
+if state[1] ~= 'open' then
+    return '0'
+end
+local remaining = tonumber(state[2]) + tonumber(ARGV[2]) - tonumber(ARGV[1])
+if remaining > 0 then
+    return tostring(remaining)
+end
+if redis.call('SET', KEYS[2], '1', 'NX', 'EX', tonumber(ARGV[3])) then
+    return '0'
+end
+return tostring(math.max(1, redis.call('TTL', KEYS[2])))
+""")
+
+# KEYS: state hash, probe key. ARGV: ok (1|0), now, failure threshold, failure window
+_RECORD = redis_client.register_script("""
+if ARGV[1] == '1' then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 'closed'
+end
+if redis.call('HGET', KEYS[1], 'state') == 'open' then
+    redis.call('HSET', KEYS[1], 'opened_at', ARGV[2])
+    redis.call('DEL', KEYS[2])
+    return 'open'
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if failures >= tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', ARGV[2])
+    redis.call('HDEL', KEYS[1], 'failures')
+    redis.call('EXPIRE', KEYS[1], 86400)
+    return 'open'
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return 'closed'
+""")
+
+
+class CircuitOpen(Exception):
+    """The target host is failing; retry_after is the number of seconds until the next probe."""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f"Circuit open for {host}, retry in {retry_after:.0f}s.")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def _host(url):
+    return urlsplit(url).netloc.lower()
+
+
+def _keys(host):
+    return f"http_breaker:{host}", f"http_breaker:probe:{host}"
+
+
+def check(url):
+    """
+    Raise CircuitOpen if requests to url's host are currently short-circuited.
+
+    The circuit opens after HTTP_BREAKER_FAILURE_THRESHOLD consecutive failures, seen by any
+    worker, and rejects requests for HTTP_BREAKER_COOLDOWN seconds. After that a single request
+    is let through as a probe (half-open); its outcome closes or re-opens the circuit.
+    If Redis is unavailable every request is allowed.
+    """
+    if not HTTP_BREAKER_ENABLED:
+        return
+    host = _host(url)
+    try:
+        retry_after = float(_ALLOW(keys=list(_keys(host)), args=[time.time(), HTTP_BREAKER_COOLDOWN, HTTP_BREAKER_PROBE_TIMEOUT]))
+    except Exception as e:
+        logging.error(f"HTTP circuit breaker unavailable for {host}: {e}")
+        return
+    if retry_after > 0:
+        raise CircuitOpen(host, retry_after)
+
+
+def record(url, ok):
+    """Report the outcome of a request that check() allowed."""
+    if not HTTP_BREAKER_ENABLED:
+        return
+    host = _host(url)
+    try:
+        state = _RECORD(keys=list(_keys(host)), args=[1 if ok else 0, time.time(), HTTP_BREAKER_FAILURE_THRESHOLD, HTTP_BREAKER_FAILURE_WINDOW])
+    except Exception as e:
+        logging.error(f"Failed to record HTTP circuit breaker outcome for {host}: {e}")
+        return
+    if not ok and state == 'open':
+        logging.warning(f"HTTP circuit open for {host}")
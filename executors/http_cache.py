@@ -0,0 +1,61 @@
+import os
+import logging
+from datetime import datetime
+
+from .redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+HTTP_CACHE_TTL = int(os.getenv("HTTP_CACHE_TTL", str(30 * 24 * 3600)))  # seconds validators outlive the last run of a schedule
+
+
+def _key(redbeat_schedule_name):
+    return f"http_cache:{redbeat_schedule_name}"
+
+
+def load_validators(redbeat_schedule_name):
+    """Last ETag / Last-Modified / body hash seen by this schedule ({} if none, or if Redis is unavailable)."""
+    if not redbeat_schedule_name:
+        return {}
+    try:
+        return redis_client.hgetall(_key(redbeat_schedule_name)) or {}
+    except Exception as e:
+        logging.error(f"Failed to load HTTP cache validators for {redbeat_schedule_name}: {e}")
+        return {}
+
+
+def save_validators(redbeat_schedule_name, response, sha256):
+    """Remember the validators of a 200 response for the schedule's next run."""
+    if not redbeat_schedule_name:
+        return
+    validators = {
+        "sha256": sha256,
+        "etag": response.headers.get('ETag') or "",
+        "last_modified": response.headers.get('Last-Modified') or "",
+        "changed_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    }
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.delete(_key(redbeat_schedule_name))
+        pipe.hset(_key(redbeat_schedule_name), mapping=validators)
+        pipe.expire(_key(redbeat_schedule_name), HTTP_CACHE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logging.error(f"Failed to save HTTP cache validators for {redbeat_schedule_name}: {e}")
+
+
+def touch(redbeat_schedule_name):
+    try:
+        redis_client.expire(_key(redbeat_schedule_name), HTTP_CACHE_TTL)
+    except Exception as e:
+        logging.error(f"Failed to refresh HTTP cache validators for {redbeat_schedule_name}: {e}")
+
+
+def conditional_headers(headers, validators):
+    """Copy of headers with If-None-Match / If-Modified-Since added from the stored validators."""
+    headers = dict(headers or {})
+    if validators.get("etag"):
+        headers.setdefault('If-None-Match', validators["etag"])
+    if validators.get("last_modified"):
+        headers.setdefault('If-Modified-Since', validators["last_modified"])
+    return headers
@@ -0,0 +1,200 @@
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from celery.worker.control import inspect_command
+
+from .redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+HTTP_LIMIT_ENABLED = os.getenv("HTTP_LIMIT_ENABLED", "Y").upper() in ("Y", "YES", "TRUE", "1")
+HTTP_LIMIT_INITIAL = float(os.getenv("HTTP_LIMIT_INITIAL", "10"))                  # concurrent requests per host to start with
+HTTP_LIMIT_MIN = float(os.getenv("HTTP_LIMIT_MIN", "1"))
+HTTP_LIMIT_MAX = float(os.getenv("HTTP_LIMIT_MAX", "200"))
+HTTP_LIMIT_DECREASE_FACTOR = float(os.getenv("HTTP_LIMIT_DECREASE_FACTOR", "0.5"))  # multiplicative decrease on overload
+HTTP_LIMIT_DECREASE_INTERVAL = float(os.getenv("HTTP_LIMIT_DECREASE_INTERVAL", "1"))  # at most one decrease per host per interval (s)
+HTTP_LIMIT_LATENCY_TOLERANCE = float(os.getenv("HTTP_LIMIT_LATENCY_TOLERANCE", "2"))  # 'slow' = latency above tolerance x average
+HTTP_LIMIT_WAIT_TIMEOUT = float(os.getenv("HTTP_LIMIT_WAIT_TIMEOUT", "60"))        # max seconds to wait for a slot
+HTTP_LIMIT_LEASE_SECONDS = float(os.getenv("HTTP_LIMIT_LEASE_SECONDS", "600"))     # slot lease, renewed every third of it while the request lasts
+
+# KEYS: inflight zset, state hash. ARGV: now, lease expiry, token, initial limit
+_ACQUIRE = redis_client.register_script("""
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local limit = tonumber(redis.call('HGET', KEYS[2], 'limit') or ARGV[4])
+if redis.call('ZCARD', KEYS[1]) < math.max(1, math.floor(limit)) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('EXPIRE', KEYS[1], 86400)
+    return 1
+end
+return 0
+""")
+
+# KEYS: inflight zset, state hash.
+# ARGV: token, outcome (ok|error), latency, now, initial, min, max, decrease factor, decrease interval, tolerance
+_RELEASE = redis_client.register_script("""
+redis.call('ZREM', KEYS[1], ARGV[1])
+local state = redis.call('HMGET', KEYS[2], 'limit', 'avg_latency', 'last_decrease')
+local limit = tonumber(state[1] or ARGV[5])
+local avg = tonumber(state[2] or ARGV[3])
+local last_decrease = tonumber(state[3] or 0)
+local latency = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local overloaded = ARGV[2] ~= 'ok' or latency > avg * tonumber(ARGV[10])
+
+if overloaded then
+    if now - last_decrease >= tonumber(ARGV[9]) then
+        limit = math.max(tonumber(ARGV[6]), limit * tonumber(ARGV[8]))
+        last_decrease = now
+    end
+else
+    limit = math.min(tonumber(ARGV[7]), limit + 1 / limit)
+end
+-- Every sample moves the baseline, so a lasting latency shift becomes the new normal instead of
+-- counting as overload (and pinning the limit at the minimum) forever
+avg = avg * 0.9 + latency * 0.1
+
+redis.call('HSET', KEYS[2], 'limit', tostring(limit), 'avg_latency', tostring(avg), 'last_decrease', tostring(last_decrease))
+redis.call('EXPIRE', KEYS[2], 86400)
+return tostring(limit)
+""")
+
+
+_held = {}  # token -> inflight key, slots held by this process
+_held_lock = threading.Lock()
+_renewer_pid = None
+
+
+class LimitTimeout(Exception):
+    """No slot for the host became free within HTTP_LIMIT_WAIT_TIMEOUT."""
+
+
+class _Slot:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency = None
+        self.outcome = None
+
+    def record(self, status_code):
+        """Record the response status once headers arrive; 429 and 5xx count as overload."""
+        self.latency = time.monotonic() - self.started
+        self.outcome = "error" if status_code == 429 or status_code >= 500 else "ok"
+
+
+def _keys(host):
+    return f"http_limit:inflight:{host}", f"http_limit:state:{host}"
+
+
+def _renew_leases():
+    # A slot is held until its body has been read, which may take longer than one lease
+    while True:
+        time.sleep(HTTP_LIMIT_LEASE_SECONDS / 3)
+        with _held_lock:
+            held = list(_held.items())
+        if not held:
+            continue
+        expiry = time.time() + HTTP_LIMIT_LEASE_SECONDS
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for token, inflight_key in held:
+                pipe.zadd(inflight_key, {token: expiry}, xx=True)
+            pipe.execute()
+        except Exception as e:
+            logging.warning(f"Failed to renew HTTP concurrency slots: {e}")
+
+
+def _hold(token, inflight_key):
+    global _renewer_pid
+    with _held_lock:
+        _held[token] = inflight_key
+        # One renewer per process (a thread, or a greenlet under gevent); prefork children start their own
+        start = _renewer_pid != os.getpid()
+        _renewer_pid = os.getpid()
+    if start:
+        threading.Thread(target=_renew_leases, name="http-limit-renewer", daemon=True).start()
+
+
+def _unhold(token):
+    with _held_lock:
+        _held.pop(token, None)
+
+
+@contextmanager
+def host_slot(url, wait_timeout=HTTP_LIMIT_WAIT_TIMEOUT):
+    """
+    Hold one of the host's adaptive concurrency slots around a request.
+
+    The per-host limit is shared by all workers through Redis and adjusted with AIMD: every
+    healthy response adds about one slot per window, while errors, 429/5xx or latency well above
+    the host's running average halve it (at most once per HTTP_LIMIT_DECREASE_INTERVAL). The slot's
+    lease is renewed until the block exits, however long the body takes. If Redis is unavailable
+    the request proceeds unlimited.
+    """
+    slot = _Slot()
+    if not HTTP_LIMIT_ENABLED:
+        yield slot
+        return
+
+    host = urlsplit(url).netloc.lower()
+    inflight_key, state_key = _keys(host)
+    token = uuid.uuid4().hex
+    acquired = False
+
+    try:
+        deadline = time.monotonic() + wait_timeout
+        delay = 0.01
+        while True:
+            now = time.time()
+            if _ACQUIRE(keys=[inflight_key, state_key], args=[now, now + HTTP_LIMIT_LEASE_SECONDS, token, HTTP_LIMIT_INITIAL]):
+                acquired = True
+                _hold(token, inflight_key)
+                break
+            if time.monotonic() >= deadline:
+                raise LimitTimeout(f"No concurrency slot for {host} within {wait_timeout}s.")
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, 0.25)
+    except LimitTimeout:
+        raise
+    except Exception as e:
+        logging.error(f"HTTP concurrency limiter unavailable for {host}, proceeding unlimited: {e}")
+
+    slot.started = time.monotonic()
+    try:
+        yield slot
+    except BaseException:
+        slot.outcome = "error"
+        raise
+    finally:
+        if acquired:
+            _unhold(token)
+            latency = slot.latency if slot.latency is not None else time.monotonic() - slot.started
+            try:
+                _RELEASE(keys=[inflight_key, state_key], args=[
+                    token, slot.outcome or "ok", latency, time.time(), HTTP_LIMIT_INITIAL, HTTP_LIMIT_MIN,
+                    HTTP_LIMIT_MAX, HTTP_LIMIT_DECREASE_FACTOR, HTTP_LIMIT_DECREASE_INTERVAL, HTTP_LIMIT_LATENCY_TOLERANCE,
+                ])
+            except Exception as e:
+                logging.error(f"Failed to release HTTP concurrency slot for {host}: {e}")
+
+
+def host_limits():
+    """Current limit, latency baseline and in-flight requests of every host, shared by all workers."""
+    hosts = {}
+    for state_key in redis_client.scan_iter(match="http_limit:state:*", count=500):
+        host = state_key[len("http_limit:state:"):]
+        inflight_key, _ = _keys(host)
+        state = redis_client.hgetall(state_key)
+        state["inflight"] = redis_client.zcount(inflight_key, time.time(), "+inf")
+        hosts[host] = state
+    return hosts
+
+
+@inspect_command()
+def http_limit_stats(state):
+    """Adaptive per-host HTTP concurrency limits: celery -A executors inspect http_limit_stats"""
+    return host_limits()
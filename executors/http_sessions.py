@@ -0,0 +1,105 @@
+import os
+import time
+import threading
+from http import cookiejar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from celery.signals import worker_shutdown
+from celery.worker.control import inspect_command
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))          # per-host pools per session (redirects may add hosts)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))                 # keep-alive connections kept per host
+HTTP_SESSION_IDLE_SECONDS = float(os.getenv("HTTP_SESSION_IDLE_SECONDS", "300"))  # close sessions unused for this long
+HTTP_EVICTION_INTERVAL = 30.0
+
+
+class SessionRegistry:
+    """
+    Keep-alive requests.Session objects shared by the HTTP executor, one per scheme+host.
+
+    Repeated requests to the same service reuse pooled TCP/TLS connections instead of opening
+    a new one per task. Sessions idle longer than idle_seconds are closed. Cookies are never
+    stored, so runs stay independent of each other as they were with plain requests.get().
+    """
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 idle_seconds=HTTP_SESSION_IDLE_SECONDS):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.idle_seconds = idle_seconds
+        self._sessions = {}   # (scheme, netloc) -> [session, last_used]
+        self._lock = threading.Lock()
+        self._last_eviction = time.monotonic()
+
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def _new_session(self, scheme):
+        session = requests.Session()
+        session.cookies.set_policy(cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount(f"{scheme}://", adapter)
+        return session
+
+    def get(self, url):
+        """Return the shared session for url's scheme and host."""
+        parts = urlsplit(url)
+        key = (parts.scheme.lower(), parts.netloc.lower())
+        now = time.monotonic()
+
+        with self._lock:
+            if now - self._last_eviction >= HTTP_EVICTION_INTERVAL:
+                self._evict_idle(now)
+
+            entry = self._sessions.get(key)
+            if entry is not None:
+                entry[1] = now
+                self.reused += 1
+                return entry[0]
+
+            session = self._new_session(key[0] or "http")
+            self._sessions[key] = [session, now]
+            self.created += 1
+            return session
+
+    def _evict_idle(self, now):
+        self._last_eviction = now
+        for key, (session, last_used) in list(self._sessions.items()):
+            if now - last_used > self.idle_seconds:
+                del self._sessions[key]
+                session.close()
+                self.evicted += 1
+
+    def close_all(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session, _ in sessions.values():
+            session.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "hosts": sorted(f"{scheme}://{netloc}" for scheme, netloc in self._sessions),
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted,
+                "pool_maxsize": self.pool_maxsize,
+            }
+
+
+http_sessions = SessionRegistry()
+
+
+@worker_shutdown.connect
+def _close_http_sessions(**kwargs):
+    http_sessions.close_all()
+
+
+@inspect_command()
+def http_session_stats(state):
+    """Keep-alive session registry counters: celery -A executors inspect http_session_stats"""
+    return http_sessions.stats()
@@ -0,0 +1,205 @@
+import os
+import queue
+import logging
+import importlib
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+
+from celery.signals import worker_init, worker_shutdown
+from celery.worker.control import inspect_command
+
+from .db_pool import worker_pool_name
+from .script_cache import ScriptCache
+from .output_capture import capture_stdout
+
+logging.basicConfig(level=logging.INFO)
+
+PYTHON_POOL_SIZE = int(os.getenv("PYTHON_POOL_SIZE", str(os.cpu_count() or 1)))                # interpreter processes per worker
+PYTHON_POOL_MAX_TASKS_PER_CHILD = int(os.getenv("PYTHON_POOL_MAX_TASKS_PER_CHILD", "100"))   # recycle a child after this many scripts
+PYTHON_POOL_TIMEOUT = float(os.getenv("PYTHON_POOL_TIMEOUT", "3600"))                         # seconds a script may run before its child is killed
+PYTHON_POOL_PRELOAD = [m.strip() for m in os.getenv("PYTHON_POOL_PRELOAD", "json").split(",") if m.strip()]
+PYTHON_POOL_WARM_START = os.getenv("PYTHON_POOL_WARM_START", "N").upper() in ("Y", "YES", "TRUE", "1")
+
+
+class ScriptError(Exception):
+    """A script raised inside an interpreter process. The message carries the remote exception."""
+
+
+def _child_main(conn, preload, max_tasks):
+    # Runs in the interpreter process: import the preload modules once, then execute
+    # scripts one at a time until max_tasks is reached, answering each over the pipe.
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.error(f"Interpreter pool could not preload '{name}': {e}")
+
+    cache = ScriptCache()
+    for _ in range(max_tasks):
+        try:
+            script_path, params = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        try:
+            exec_globals = {"__builtins__": __builtins__}
+            exec_globals.update(params)
+            with capture_stdout() as output_buffer:
+                exec(cache.get(script_path), exec_globals)
+            conn.send(("ok", output_buffer.getvalue()))
+        except BaseException as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    conn.close()
+
+
+class _Child:
+    def __init__(self, ctx, preload, max_tasks):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_child_main, args=(child_conn, preload, max_tasks), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.max_tasks = max_tasks
+        self.tasks = 0
+
+    @property
+    def exhausted(self):
+        return self.tasks >= self.max_tasks or not self.process.is_alive()
+
+    def stop(self, kill=False):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if kill and self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+
+class InterpreterPool:
+    """
+    A fixed set of warm interpreter processes for CPU-bound scripts.
+
+    Each script runs in its own process, so it neither holds the worker's GIL nor blocks the
+    gevent hub; the caller only waits on the result pipe. Children are spawned (not forked from
+    the worker), import PYTHON_POOL_PRELOAD up front and are replaced after max_tasks_per_child
+    scripts, on a timeout, or when they die.
+    """
+
+    def __init__(self, size=PYTHON_POOL_SIZE, max_tasks_per_child=PYTHON_POOL_MAX_TASKS_PER_CHILD,
+                 preload=PYTHON_POOL_PRELOAD):
+        self.size = max(1, size)
+        self.max_tasks_per_child = max(1, max_tasks_per_child)
+        self.preload = list(preload)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.tasks = 0
+        self.recycled = 0
+        self.timeouts = 0
+
+        for _ in range(self.size):
+            self._idle.put(self._start_child())
+
+    def _start_child(self):
+        return _Child(self._ctx, self.preload, self.max_tasks_per_child)
+
+    def run(self, script_path, params, timeout=PYTHON_POOL_TIMEOUT):
+        """Execute script_path with params injected as globals in a pooled process and return its stdout."""
+        child = self._idle.get()
+        replace = False
+        try:
+            if not child.process.is_alive():
+                child.stop()
+                child = self._start_child()
+
+            child.conn.send((script_path, dict(params or {})))
+            if not wait([child.conn], timeout):
+                replace = True
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"Script did not finish within {timeout}s.")
+
+            try:
+                status, payload = child.conn.recv()
+            except (EOFError, OSError):
+                replace = True
+                raise RuntimeError(f"Interpreter process exited with code {child.process.exitcode}.")
+
+            child.tasks += 1
+            with self._lock:
+                self.tasks += 1
+        except BaseException:
+            replace = True
+            raise
+        finally:
+            if replace or child.exhausted:
+                child.stop(kill=replace)
+                with self._lock:
+                    self.recycled += 1
+                child = self._start_child() if not self._closed else None
+            if child is not None:
+                self._idle.put(child)
+
+        if status == "error":
+            raise ScriptError(payload)
+        return payload
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop(kill=True)
+            except queue.Empty:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "max_tasks_per_child": self.max_tasks_per_child,
+                "tasks": self.tasks,
+                "recycled": self.recycled,
+                "timeouts": self.timeouts,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_interpreter_pool():
+    """Return the worker's interpreter pool, starting it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InterpreterPool()
+                logging.info(f"Python interpreter pool started ({_pool.size} processes).")
+    return _pool
+
+
+@worker_init.connect
+def _warm_start_interpreter_pool(sender=None, **kwargs):
+    # Prefork workers are already multi-process; forking their children would inherit the pipes.
+    if PYTHON_POOL_WARM_START and worker_pool_name(sender) != "prefork":
+        get_interpreter_pool()
+
+
+@worker_shutdown.connect
+def _close_interpreter_pool(**kwargs):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@inspect_command()
+def interpreter_pool_stats(state):
+    """Interpreter pool counters: celery -A executors inspect interpreter_pool_stats"""
+    return _pool.stats() if _pool is not None else {}
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from bisect import bisect_left
+
+from celery.signals import before_task_publish, task_prerun, task_postrun
+
+from .redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "Y").upper() in ("Y", "YES", "TRUE", "1")
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "metrics:executor")  # Redis hash per histogram, shared by every worker process and host
+
+PUBLISHED_AT_HEADER = "published_at"
+
+# name -> (help text, upper bucket bounds); the implicit +Inf bucket follows the last bound
+HISTOGRAMS = {
+    "queue_wait_seconds": (
+        "Time from publish (or ETA/countdown) to the start of an executor run.",
+        (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+    ),
+    "run_seconds": (
+        "Executor run time, from task_prerun to task_postrun.",
+        (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+    ),
+    "result_bytes": (
+        "Size of the executor's return value as compact JSON.",
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+    ),
+}
+COUNTER = "runs_total"  # runs by final state
+
+_started = {}  # task_id -> monotonic start, for tasks running in this process
+_started_lock = threading.Lock()
+
+
+def _is_executor(task):
+    return task is not None and task.name.endswith(".execute")
+
+
+def _labels(task, args):
+    # Executors take the task_name defined in def_async_tasks as their third positional argument
+    task_name = args[2] if args and len(args) > 2 and args[2] else ""
+    return task.name, str(task_name)
+
+
+def _field(labels, suffix):
+    return "\x1f".join((*labels, suffix))
+
+
+def observe(pipe, name, labels, value):
+    """Queue one observation of a histogram on a Redis pipeline (non-cumulative bucket, sum, count)."""
+    bounds = HISTOGRAMS[name][1]
+    key = f"{METRICS_PREFIX}:{name}"
+    pipe.hincrby(key, _field(labels, str(bisect_left(bounds, value))), 1)
+    pipe.hincrbyfloat(key, _field(labels, "sum"), value)
+    pipe.hincrby(key, _field(labels, "count"), 1)
+
+
+@before_task_publish.connect
+def _stamp_published_at(headers=None, **kwargs):
+    # Retries and countdowns are re-published, so the stamp always belongs to the current attempt
+    if METRICS_ENABLED and headers is not None:
+        headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def _record_start(task_id=None, task=None, args=None, **kwargs):
+    if not METRICS_ENABLED or not _is_executor(task):
+        return
+    with _started_lock:
+        _started[task_id] = time.monotonic()
+
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    if published_at is None:  # eager calls and messages from publishers without the signal
+        return
+    eta = task.request.eta
+    ready_at = float(published_at)
+    if eta:
+        try:
+            ready_at = max(ready_at, datetime.fromisoformat(eta).timestamp())
+        except (TypeError, ValueError):
+            pass
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        observe(pipe, "queue_wait_seconds", _labels(task, args), max(0.0, time.time() - ready_at))
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"Failed to record queue wait for task {task_id}: {e}")
+
+
+@task_postrun.connect
+def _record_run(task_id=None, task=None, args=None, retval=None, state=None, **kwargs):
+    if not METRICS_ENABLED or not _is_executor(task):
+        return
+    with _started_lock:
+        started = _started.pop(task_id, None)
+    labels = _labels(task, args)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        if started is not None:
+            observe(pipe, "run_seconds", labels, time.monotonic() - started)
+        if state == "SUCCESS":
+            size = len(json.dumps(retval, default=str, separators=(",", ":")).encode("utf-8"))
+            observe(pipe, "result_bytes", labels, size)
+        pipe.hincrby(f"{METRICS_PREFIX}:{COUNTER}", _field(labels, str(state)), 1)
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"Failed to record run metrics for task {task_id}: {e}")
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(executor, task_name, **extra):
+    pairs = [("executor", executor), ("task_name", task_name), *extra.items()]
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render_metrics():
+    """All executor metrics in the Prometheus text exposition format (version 0.0.4)."""
+    names = list(HISTOGRAMS)
+    pipe = redis_client.pipeline(transaction=False)
+    for name in names:
+        pipe.hgetall(f"{METRICS_PREFIX}:{name}")
+    pipe.hgetall(f"{METRICS_PREFIX}:{COUNTER}")
+    *histograms, counter = pipe.execute()
+
+    lines = []
+    for name, fields in zip(names, histograms):
+        help_text, bounds = HISTOGRAMS[name]
+        metric = f"celery_executor_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+
+        series = {}
+        for field, value in fields.items():
+            executor, task_name, suffix = field.split("\x1f")
+            series.setdefault((executor, task_name), {})[suffix] = value
+
+        for (executor, task_name), values in sorted(series.items()):
+            cumulative = 0
+            for index, bound in enumerate((*bounds, "+Inf")):
+                cumulative += int(values.get(str(index), 0))
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{metric}_bucket{{{_label_text(executor, task_name, le=le)}}} {cumulative}")
+            lines.append(f"{metric}_sum{{{_label_text(executor, task_name)}}} {_number(values.get('sum', 0))}")
+            lines.append(f"{metric}_count{{{_label_text(executor, task_name)}}} {values.get('count', 0)}")
+
+    metric = f"celery_executor_{COUNTER}"
+    lines.append(f"# HELP {metric} Executor runs by final state.")
+    lines.append(f"# TYPE {metric} counter")
+    for field, value in sorted(counter.items()):
+        executor, task_name, state = field.split("\x1f")
+        lines.append(f"{metric}{{{_label_text(executor, task_name, state=state)}}} {value}")
+
+    return "\n".join(lines) + "\n"
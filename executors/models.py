@@ -4,6 +4,7 @@ from sqlalchemy.dialects.postgresql import JSONB
 from .extensions import db
 from sqlalchemy import Text, TIMESTAMP
 from sqlalchemy.sql import func
+from .envelope import unpack
 
 
 
@@ -278,6 +279,13 @@ class DefAsyncTask(db.Model):
     cancelled_yn     = db.Column(db.String(1), default='N')  # Default 'N'
     srs              = db.Column(db.String(1), default='N')  # Default 'N'
     sf               = db.Column(db.String(1), default='N')  # Default 'N'
+    execution_mode   = db.Column(db.String(50))  # Executor-specific run mode (optional), e.g. 'process_pool' for python scripts
+    max_retries      = db.Column(db.Integer)  # Retry budget per run (optional, executor default if null)
+    retry_backoff    = db.Column(db.Integer)  # Base retry delay in seconds, doubled per attempt (optional)
+    def_data_source_id = db.Column(db.Integer, db.ForeignKey('apps.def_data_sources.def_data_source_id'))  # Target database of procedures/functions (optional, DATABASE_URL if null)
+    queue_name       = db.Column(db.String(100))  # Celery queue for this task's runs (optional, executor's routed queue if null)
+    max_concurrency  = db.Column(db.Integer)  # Runs of this task at once across all workers (optional, unlimited if null)
+    rate_limit       = db.Column(db.String(20))  # Runs started per period, e.g. '30/m' (optional, unlimited if null)
     created_by       = db.Column(db.Integer)  # User who created the record (optional)
     creation_date    = db.Column(db.TIMESTAMP, default=datetime.utcnow)  # Timestamp of creation
     last_updated_by  = db.Column(db.Integer)  # User who last updated the record (optional)
@@ -297,6 +305,13 @@ class DefAsyncTask(db.Model):
             "cancelled_yn": self.cancelled_yn,
             "srs": self.srs,
             "sf": self.sf,
+            "execution_mode": self.execution_mode,
+            "max_retries": self.max_retries,
+            "retry_backoff": self.retry_backoff,
+            "def_data_source_id": self.def_data_source_id,
+            "queue_name": self.queue_name,
+            "max_concurrency": self.max_concurrency,
+            "rate_limit": self.rate_limit,
             "created_by": self.created_by,
             "creation_date": self.creation_date,
             "last_updated_by": self.last_updated_by,
@@ -444,9 +459,10 @@ class DefAsyncTaskRequest(db.Model):
             "schedule_type": self.schedule_type,
             "schedule": self.schedule,
             "args": self.args,
-            "kwargs": self.kwargs,
-            "parameters": self.parameters,
-            "result": self.result,
+            "kwargs": unpack(self.kwargs),
+            # Results in the v1 envelope carry the parameters once, as kwargs, possibly compressed
+            "parameters": self.parameters if self.parameters is not None else unpack(self.kwargs),
+            "result": unpack(self.result),
             "timestamp": self.timestamp,
             "created_by": self.created_by,
             "creation_date": self.creation_date,
@@ -0,0 +1,58 @@
+import io
+import sys
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# The buffer that print()/sys.stdout writes of the current execution go to. Each greenlet and
+# each thread has its own context, so concurrent executions never see each other's buffer.
+_current_sink = contextvars.ContextVar("executor_stdout_sink", default=None)
+_install_lock = threading.Lock()
+
+
+class _StdoutProxy:
+    """Stand-in for sys.stdout that writes to the current execution's buffer, if any, else to the real stream."""
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+
+    def _target(self):
+        sink = _current_sink.get()
+        return sink if sink is not None else self._fallback
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def writelines(self, lines):
+        return self._target().writelines(lines)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+def _install():
+    # Installed lazily and re-installed if something (e.g. Celery's stdout redirection) replaced it.
+    if isinstance(sys.stdout, _StdoutProxy):
+        return
+    with _install_lock:
+        if not isinstance(sys.stdout, _StdoutProxy):
+            sys.stdout = _StdoutProxy(sys.stdout)
+
+
+@contextmanager
+def capture_stdout():
+    """
+    Collect everything the calling greenlet/thread writes to sys.stdout into a private StringIO.
+
+    Unlike swapping sys.stdout, this is safe with many executions running concurrently in one worker.
+    """
+    _install()
+    buffer = io.StringIO()
+    token = _current_sink.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current_sink.reset(token)
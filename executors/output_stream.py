@@ -0,0 +1,114 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from .redis_client import redis_client
+
+logging.basicConfig(level=logging.INFO)
+
+OUTPUT_MAX_BYTES = int(os.getenv("OUTPUT_MAX_BYTES", str(10 * 1024 * 1024)))  # output published to the live tail per run; the rest only reaches the in-memory tails
+OUTPUT_BUFFER_LINES = int(os.getenv("OUTPUT_BUFFER_LINES", "1000"))           # tail of each stream kept in memory for the task result
+OUTPUT_MAX_LINE_LENGTH = int(os.getenv("OUTPUT_MAX_LINE_LENGTH", "65536"))    # longer lines are split
+OUTPUT_STREAM_MAXLEN = int(os.getenv("OUTPUT_STREAM_MAXLEN", "10000"))        # approximate entries kept in the Redis stream
+OUTPUT_STREAM_TTL = int(os.getenv("OUTPUT_STREAM_TTL", "86400"))              # seconds the Redis stream outlives the run
+OUTPUT_FLUSH_LINES = 100
+OUTPUT_FLUSH_SECONDS = 0.5
+
+
+def output_stream_key(task_id):
+    return f"task_output:{task_id}"
+
+
+class OutputCollector:
+    """
+    Collects a process's stdout/stderr line by line while it runs.
+
+    Each stream keeps its last OUTPUT_BUFFER_LINES lines in memory, and every line is also
+    appended (in small pipelined batches, at least every OUTPUT_FLUSH_SECONDS) to the Redis stream
+    task_output:<task_id> so the run can be tailed live. Once max_bytes have been published the
+    live tail ends there (truncated); the in-memory tails keep following both streams to the end.
+    """
+
+    def __init__(self, task_id, max_bytes=OUTPUT_MAX_BYTES, buffer_lines=OUTPUT_BUFFER_LINES):
+        self.key = output_stream_key(task_id) if task_id else None
+        self.max_bytes = max_bytes
+        self.lines = {"stdout": deque(maxlen=buffer_lines), "stderr": deque(maxlen=buffer_lines)}
+        self.line_counts = {"stdout": 0, "stderr": 0}
+        self.bytes = 0
+        self.truncated = False
+
+        self._pending = []
+        self._closed = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        if self.key:
+            threading.Thread(target=self._flush_periodically, name="output-flush", daemon=True).start()
+
+    def consume(self, stream_name, pipe):
+        """Read pipe until EOF. Safe to call for stdout and stderr from two threads/greenlets."""
+        for line in iter(lambda: pipe.readline(OUTPUT_MAX_LINE_LENGTH), ''):
+            self.add(stream_name, line.rstrip("\n"))
+
+    def add(self, stream_name, line):
+        with self._lock:
+            self.line_counts[stream_name] += 1
+            self.lines[stream_name].append(line)
+
+            # Only publishing is capped; once over the cap nothing more is published, so the live
+            # tail ends at the cut-off rather than with stray later lines
+            size = len(line.encode("utf-8", "replace")) + 1
+            if self.truncated or self.bytes + size > self.max_bytes:
+                self.truncated = True
+                return
+            self.bytes += size
+
+            if self.key:
+                self._pending.append({"stream": stream_name, "line": line})
+                if len(self._pending) >= OUTPUT_FLUSH_LINES:
+                    self._flush()
+
+    def _flush_periodically(self):
+        # Output followed by a silent stretch still reaches the live tail within OUTPUT_FLUSH_SECONDS
+        while not self._stopped.wait(OUTPUT_FLUSH_SECONDS):
+            with self._lock:
+                if self._pending and time.monotonic() - self._last_flush >= OUTPUT_FLUSH_SECONDS:
+                    self._flush()
+
+    def _flush(self, final=False):
+        pending, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        if final:
+            pending.append({"stream": "eof", "line": "truncated" if self.truncated else ""})
+        if not pending:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for entry in pending:
+                pipe.xadd(self.key, entry, maxlen=OUTPUT_STREAM_MAXLEN, approximate=True)
+            pipe.expire(self.key, OUTPUT_STREAM_TTL)
+            pipe.execute()
+        except Exception as e:
+            # Live tail is best effort; the task result still carries the buffered tail
+            logging.error(f"Failed to publish output to {self.key}: {e}")
+
+    def close(self):
+        self._stopped.set()
+        with self._lock:
+            if self.key and not self._closed:
+                self._flush(final=True)
+            self._closed = True
+
+    def text(self, stream_name):
+        return "\n".join(self.lines[stream_name]).strip()
+
+    def summary(self):
+        return {
+            "stdout_lines": self.line_counts["stdout"],
+            "stderr_lines": self.line_counts["stderr"],
+            "bytes": self.bytes,
+            "truncated": self.truncated,
+        }
@@ -1,40 +1,43 @@
 import json
-import sys
-import io
 import os
 from celery import shared_task
+from .script_cache import script_cache
+from .output_capture import capture_stdout
+from .interpreter_pool import get_interpreter_pool
+from .task_definitions import get_task_definition
+from .envelope import envelope
+from .run_limits import run_limited
 
 script_path = os.getenv("SCRIPT_PATH_01")
 
 @shared_task(bind=True)
+@run_limited()
 def execute(self, *args, **kwargs):
     script_name = args[0] if len(args) > 0 else None
-    user_task_name = args[1] if len(args) > 1 else None
     task_name = args[2] if len(args) > 2 else None
-    user_schedule_name = args[3] if len(args) > 3 else None
-    redbeat_schedule_name = args[4] if len(args) > 4 else None
-    schedule_type = args[5] if len(args) > 5 else None
-    schedule = args[6] if len(args) > 6 else None
 
     params = kwargs  # Use kwargs as script parameters
     full_script_path = os.path.join(script_path, script_name)
 
     try:
-        # Capture script output
-        original_stdout = sys.stdout
-        sys.stdout = io.StringIO()
+        task_definition = get_task_definition(task_name) or {}
 
-        # Read & Execute the script
-        with open(full_script_path, 'r') as file:
-            script_content = file.read()
+        if task_definition.get("execution_mode") == "process_pool":
+            # CPU-bound scripts run in a warm interpreter process so they don't hold this worker's GIL
+            raw_output = get_interpreter_pool().run(full_script_path, params).strip()
+        else:
+            # Compile (or reuse the cached compile of) the script
+            script_code = script_cache.get(full_script_path)
 
-        exec_globals = {"__builtins__": __builtins__}  # Safe execution context
-        exec_globals.update(params)  # Inject parameters
+            exec_globals = {"__builtins__": __builtins__}  # Safe execution context
+            exec_globals.update(params)  # Inject parameters
 
-        exec(script_content, exec_globals)
+            # Execute the script, capturing its output into a buffer private to this execution
+            with capture_stdout() as output_buffer:
+                exec(script_code, exec_globals)
 
-        # Get script output
-        raw_output = sys.stdout.getvalue().strip()
+            # Get script output
+            raw_output = output_buffer.getvalue().strip()
 
         # Ensure output is a dictionary
         try:
@@ -42,24 +45,7 @@ def execute(self, *args, **kwargs):
         except json.JSONDecodeError:
             output = {"output": raw_output}  # Keep as dictionary if not JSON
 
-        return {
-            "user_task_name": user_task_name,
-            "task_name": task_name,
-            "executor": self.name,
-            "user_schedule_name": user_schedule_name,
-            "redbeat_schedule_name": redbeat_schedule_name,
-            "schedule_type":schedule_type,
-            "schedule": schedule,
-            "args": args,
-            "kwargs": params,
-            "parameters": params,
-            "result": output,  #  Ensures dictionary format
-            "message": "Script executed successfully!"
-        }
+        return envelope(self.name, args, params, output, "Script executed successfully!")  # output is always a dictionary
 
     except Exception as e:
         return {"error": f"Script execution failed: {str(e)}"}
-
-    finally:
-        # Restore stdout safely
-        sys.stdout = original_stdout
@@ -0,0 +1,72 @@
+import os
+import io
+import csv
+import json
+import uuid
+
+from .artifacts import ArtifactWriter
+from .green import is_green
+
+EXPORT_ITERSIZE = int(os.getenv("EXPORT_ITERSIZE", "5000"))  # rows fetched from the server-side cursor per round trip
+EXPORT_FORMATS = ("ndjson", "csv")
+
+
+def _cursor_export(conn, query, params, fmt, writer, itersize):
+    """Stream rows through a named (server-side) cursor, writing one encoded chunk per fetch."""
+    rows = 0
+    with conn.cursor(name=f"export_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = itersize
+        cursor.execute(query, params)
+
+        columns = None
+        while True:
+            chunk = cursor.fetchmany(itersize)
+            if columns is None:
+                columns = [column.name for column in cursor.description]
+                if fmt == "csv":
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerow(columns)
+                    writer.write(buffer.getvalue())
+            if not chunk:
+                break
+
+            if fmt == "csv":
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(chunk)
+                writer.write(buffer.getvalue())
+            else:
+                writer.write("".join(
+                    json.dumps(dict(zip(columns, row)), default=str, separators=(",", ":")) + "\n" for row in chunk
+                ))
+            rows += len(chunk)
+    return rows
+
+
+def _copy_export(conn, query, params, writer):
+    """Let the server encode the CSV with COPY ... TO STDOUT; psycopg2 hands it over in chunks."""
+    with conn.cursor() as cursor:
+        statement = cursor.mogrify(query, params)  # COPY takes no bind parameters
+        cursor.copy_expert(b"COPY (" + statement + b") TO STDOUT WITH (FORMAT csv, HEADER)", writer)
+        return cursor.rowcount
+
+
+def export_query(conn, query, params=None, fmt="ndjson", kind="query", itersize=EXPORT_ITERSIZE):
+    """
+    Run a row-returning query and stream its rows into a gzip-compressed artifact, never holding
+    more than one fetch of rows in memory. Returns {"rows", "format", "artifact"}.
+
+    CSV is produced with COPY TO STDOUT, except under the gevent wait callback where COPY is not
+    supported; there, like NDJSON, it is built from a named cursor fetched itersize rows at a time.
+    The caller owns the transaction (named cursors need one) and decides whether to commit.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    with ArtifactWriter(kind, suffix=f".{fmt}", compress=True) as writer:
+        if fmt == "csv" and not is_green():
+            rows = _copy_export(conn, query, params, writer)
+        else:
+            rows = _cursor_export(conn, query, params, fmt, writer, itersize)
+        artifact = writer.commit()
+
+    return {"rows": rows, "format": fmt, "artifact": artifact}
@@ -0,0 +1,6 @@
+#tasks.redis_client.py
+from redis import Redis
+from config import redis_url
+
+# Shared client for executor-side Redis use (output streams, caches, limits); the broker has its own connections
+redis_client = Redis.from_url(redis_url, decode_responses=True)
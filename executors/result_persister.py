@@ -0,0 +1,195 @@
+"""
+Write-behind of task completions into def_async_task_requests when RESULT_BACKEND=redis.
+
+Workers append one entry per finished executor run to the RESULT_STREAM Redis stream
+(executors/result_stream.py); this process drains it through a consumer group and inserts the rows
+in batches with a single multi-row INSERT ... ON CONFLICT (task_id) DO NOTHING per batch.
+
+Entries are acknowledged (and deleted) only after the batch commits, so delivery is at least once:
+a persister that dies mid-batch leaves its entries pending, they are claimed by another consumer
+after RESULT_PERSISTER_CLAIM_IDLE seconds, and the duplicate insert is a no-op on task_id.
+
+    python -m executors.result_persister
+"""
+import os
+import json
+import time
+import signal
+import socket
+import logging
+
+import psycopg2
+import psycopg2.extras
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError
+
+from config import database_url
+from .redis_client import redis_client
+from .result_stream import RESULT_STREAM
+
+logging.basicConfig(level=logging.INFO)
+
+RESULT_PERSISTER_GROUP = os.getenv("RESULT_PERSISTER_GROUP", "result_persisters")  # consumer group on RESULT_STREAM
+RESULT_PERSISTER_BATCH_SIZE = int(os.getenv("RESULT_PERSISTER_BATCH_SIZE", "500"))  # entries per INSERT/commit
+RESULT_PERSISTER_BLOCK_MS = int(os.getenv("RESULT_PERSISTER_BLOCK_MS", "1000"))  # longest wait for new entries, doubles as batching window
+RESULT_PERSISTER_CLAIM_IDLE = int(os.getenv("RESULT_PERSISTER_CLAIM_IDLE", "60"))  # seconds before another consumer's pending entries are taken over
+RESULT_PERSISTER_RETRY_MAX = float(os.getenv("RESULT_PERSISTER_RETRY_MAX", "30"))  # cap on the back-off after a failed batch
+
+COLUMNS = (
+    "task_id", "status", "user_task_name", "task_name", "executor", "user_schedule_name",
+    "redbeat_schedule_name", "schedule_type", "kwargs", "result", "timestamp",
+)
+JSON_COLUMNS = {"kwargs", "result"}
+
+INSERT_SQL = (
+    f"INSERT INTO def_async_task_requests ({', '.join(COLUMNS)}, creation_date, last_update_date) VALUES %s "
+    "ON CONFLICT (task_id) DO NOTHING"
+)
+VALUES_TEMPLATE = f"({', '.join(['%s'] * len(COLUMNS))}, now(), now())"
+
+
+def ensure_group():
+    try:
+        redis_client.xgroup_create(RESULT_STREAM, RESULT_PERSISTER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def decode(entries):
+    """(entry ids, row tuples) for a batch; undecodable entries are logged and acknowledged with the rest."""
+    ids, rows = [], {}
+    for entry_id, fields in entries:
+        ids.append(entry_id)
+        if not fields:  # deleted from the stream while pending
+            continue
+        try:
+            row = json.loads(fields["row"])
+        except (KeyError, ValueError) as e:
+            logging.error(f"Skipping malformed result stream entry {entry_id}: {e}")
+            continue
+        # A task id seen twice in one batch would make the multi-row insert touch a row twice
+        rows[row["task_id"]] = row_values(row)
+    return ids, list(rows.values())
+
+
+def row_values(row):
+    """A completion row (see result_stream.completion_row) as INSERT_SQL values."""
+    return tuple(
+        psycopg2.extras.Json(row.get(column)) if column in JSON_COLUMNS else row.get(column)
+        for column in COLUMNS
+    )
+
+
+def persist(conn, rows):
+    """Insert a batch in one transaction; returns the number of new rows."""
+    if not rows:
+        return 0
+    with conn.cursor() as cursor:
+        psycopg2.extras.execute_values(cursor, INSERT_SQL, rows, template=VALUES_TEMPLATE, page_size=len(rows))
+        inserted = cursor.rowcount
+    conn.commit()
+    return inserted
+
+
+def acknowledge(ids):
+    if not ids:
+        return
+    pipe = redis_client.pipeline()
+    pipe.xack(RESULT_STREAM, RESULT_PERSISTER_GROUP, *ids)
+    pipe.xdel(RESULT_STREAM, *ids)  # keeps XLEN equal to the unpersisted backlog the workers watch
+    pipe.execute()
+
+
+class Persister:
+    def __init__(self, consumer=None):
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.conn = None
+        self.running = True
+        self.claim_cursor = "0-0"
+        self.backlog_checked = False  # this consumer's own pending entries (from a previous run) come first
+        self.stats = {"batches": 0, "entries": 0, "inserted": 0, "claimed": 0, "failures": 0}
+
+    def stop(self, *args):
+        self.running = False
+
+    def connection(self):
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(database_url)
+        return self.conn
+
+    def next_batch(self):
+        if not self.backlog_checked:
+            response = redis_client.xreadgroup(
+                RESULT_PERSISTER_GROUP, self.consumer, {RESULT_STREAM: "0"}, count=RESULT_PERSISTER_BATCH_SIZE,
+            )
+            entries = response[0][1] if response else []
+            if entries:
+                return entries
+            self.backlog_checked = True
+
+        # Entries another persister read but never acknowledged (it died or stalled)
+        self.claim_cursor, claimed, *_ = redis_client.xautoclaim(
+            RESULT_STREAM, RESULT_PERSISTER_GROUP, self.consumer, RESULT_PERSISTER_CLAIM_IDLE * 1000,
+            start_id=self.claim_cursor, count=RESULT_PERSISTER_BATCH_SIZE,
+        )
+        if claimed:
+            self.stats["claimed"] += len(claimed)
+            logging.info(f"Claimed {len(claimed)} stale result stream entries")
+            return claimed
+
+        response = redis_client.xreadgroup(
+            RESULT_PERSISTER_GROUP, self.consumer, {RESULT_STREAM: ">"},
+            count=RESULT_PERSISTER_BATCH_SIZE, block=RESULT_PERSISTER_BLOCK_MS,
+        )
+        return response[0][1] if response else []
+
+    def run_once(self):
+        entries = self.next_batch()
+        if not entries:
+            return 0
+        ids, rows = decode(entries)
+        try:
+            inserted = persist(self.connection(), rows)
+        except psycopg2.Error:
+            if self.conn is not None and not self.conn.closed:
+                self.conn.rollback()
+            self.backlog_checked = False  # the failed batch stays pending and is read again first
+            raise
+        acknowledge(ids)
+        self.stats["batches"] += 1
+        self.stats["entries"] += len(ids)
+        self.stats["inserted"] += inserted
+        return len(ids)
+
+    def run(self):
+        ensure_group()
+        logging.info(f"Persisting {RESULT_STREAM} into def_async_task_requests as {self.consumer}")
+        delay = 1.0
+        while self.running:
+            try:
+                count = self.run_once()
+                delay = 1.0
+                if count:
+                    logging.info(f"Persisted {count} task results ({self.stats})")
+            except (psycopg2.Error, RedisConnectionError, OSError) as e:
+                # Nothing is acknowledged, so the batch is retried; back off rather than spin
+                self.stats["failures"] += 1
+                logging.error(f"Result batch failed, retrying in {delay:.0f}s: {e}")
+                if isinstance(e, psycopg2.OperationalError) and self.conn is not None:
+                    self.conn.close()
+                time.sleep(delay)
+                delay = min(delay * 2, RESULT_PERSISTER_RETRY_MAX)
+        if self.conn is not None:
+            self.conn.close()
+        logging.info(f"Result persister stopped ({self.stats})")
+
+
+def main():
+    persister = Persister()
+    signal.signal(signal.SIGTERM, persister.stop)
+    signal.signal(signal.SIGINT, persister.stop)
+    persister.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+from celery import states
+from celery.signals import task_postrun
+
+from redis.exceptions import RedisError
+
+from config import result_backend
+from .redis_client import redis_client
+from .db_pool import get_pool
+from .envelope import RESULT_ENVELOPE_VERSION, pack
+
+logging.basicConfig(level=logging.INFO)
+
+RESULT_STREAM = os.getenv("RESULT_STREAM", "task_completions")  # Redis stream drained by executors/result_persister.py
+RESULT_STREAM_HIGH_WATERMARK = int(os.getenv("RESULT_STREAM_HIGH_WATERMARK", "50000"))  # backlog above which workers slow down
+RESULT_STREAM_MAX_WAIT = float(os.getenv("RESULT_STREAM_MAX_WAIT", "30"))  # seconds a completion may wait for the backlog to drain
+RESULT_STREAM_CHECK_INTERVAL = 1.0  # seconds between XLEN checks while under the watermark
+
+FINAL_STATES = (states.SUCCESS, states.FAILURE)
+
+_backlog = {"length": 0, "checked_at": 0.0}
+_backlog_lock = threading.Lock()
+
+
+def _arg(args, index):
+    return args[index] if args and len(args) > index else None
+
+
+def completion_row(task_id, executor, args, kwargs, retval, state, done_at):
+    """
+    The def_async_task_requests row for a finished task, laid out like the v1 envelope: identity
+    columns, kwargs and result (both possibly packed), with the schedule referenced by name.
+    Error dicts and exceptions, which carry no identity, take it from the task's positional args.
+    """
+    if isinstance(retval, dict) and retval.get("v") == RESULT_ENVELOPE_VERSION:
+        source = retval
+        kwargs_value = retval.get("kwargs")
+        result = retval.get("result")
+    else:
+        source = {
+            "user_task_name": _arg(args, 1),
+            "task_name": _arg(args, 2),
+            "user_schedule_name": _arg(args, 3),
+            "redbeat_schedule_name": _arg(args, 4),
+            "schedule_type": _arg(args, 5),
+        }
+        kwargs_value = pack(kwargs or None)
+        if isinstance(retval, BaseException):
+            result = {"error": str(retval), "type": type(retval).__name__}
+        else:
+            result = pack(retval)
+
+    return {
+        "task_id": task_id,
+        "status": state,
+        "user_task_name": source.get("user_task_name"),
+        "task_name": source.get("task_name"),
+        "executor": source.get("executor") or executor,
+        "user_schedule_name": source.get("user_schedule_name"),
+        "redbeat_schedule_name": source.get("redbeat_schedule_name"),
+        "schedule_type": source.get("schedule_type"),
+        "kwargs": kwargs_value,
+        "result": result,
+        "timestamp": done_at.isoformat(),
+    }
+
+
+def _wait_for_capacity():
+    """
+    Backpressure: while the stream holds more than RESULT_STREAM_HIGH_WATERMARK unpersisted
+    completions, hold the finishing task (and so the worker slot) for up to RESULT_STREAM_MAX_WAIT
+    seconds. Completions are never dropped; past the deadline they are appended anyway.
+    """
+    deadline = time.monotonic() + RESULT_STREAM_MAX_WAIT
+    delay = 0.1
+    while True:
+        now = time.monotonic()
+        with _backlog_lock:
+            if now - _backlog["checked_at"] >= RESULT_STREAM_CHECK_INTERVAL:
+                _backlog["length"] = redis_client.xlen(RESULT_STREAM)
+                _backlog["checked_at"] = now
+            length = _backlog["length"]
+        if length < RESULT_STREAM_HIGH_WATERMARK:
+            return
+        if now >= deadline:
+            logging.warning(f"Result stream backlog at {length} entries; is the result persister running?")
+            return
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+        with _backlog_lock:
+            _backlog["checked_at"] = 0.0
+
+
+def publish_completion(row):
+    """
+    Append a completion to the stream, retrying with backoff for up to RESULT_STREAM_MAX_WAIT
+    seconds while Redis is unreachable; the last error is raised if it never comes back.
+    """
+    deadline = time.monotonic() + RESULT_STREAM_MAX_WAIT
+    delay = 0.1
+    while True:
+        try:
+            _wait_for_capacity()
+            redis_client.xadd(RESULT_STREAM, {"row": json.dumps(row, default=str, separators=(",", ":"))})
+            break
+        except RedisError as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logging.warning(f"Failed to stream completion of task {row['task_id']}, retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+    with _backlog_lock:
+        _backlog["length"] += 1
+
+
+def persist_completion(row):
+    """Write a completion straight into def_async_task_requests, bypassing the stream."""
+    from .result_persister import persist, row_values  # imports this module for RESULT_STREAM
+    with get_pool().connection() as conn:
+        persist(conn, [row_values(row)])
+
+
+def _is_executor_result(task, retval):
+    # Executor entry points are the tasks named <module>.execute; chord callbacks such as
+    # merge_fanout finish a run on the parent's task id and return the envelope themselves
+    return task.name.endswith(".execute") or (isinstance(retval, dict) and retval.get("v") == RESULT_ENVELOPE_VERSION)
+
+
+@task_postrun.connect
+def _stream_completion(sender=None, task_id=None, task=None, args=None, kwargs=None, retval=None, state=None, **extra):
+    if result_backend != "redis" or state not in FINAL_STATES or task is None:
+        return
+    if not _is_executor_result(task, retval):
+        return
+    row = completion_row(task_id, task.name, args, kwargs, retval, state, datetime.utcnow())
+    try:
+        publish_completion(row)
+    except Exception as e:
+        # Redis stayed unreachable: write the row synchronously instead (same idempotent insert as
+        # the persister). If that fails too the error propagates and Celery logs it with the task.
+        logging.error(f"Result stream unavailable, writing the completion of task {task_id} directly: {e}")
+        persist_completion(row)
@@ -0,0 +1,346 @@
+import os
+import re
+import time
+import uuid
+import random
+import logging
+import functools
+from contextlib import contextmanager
+
+from redis import Redis
+from gevent.monkey import get_original
+
+from config import redis_url
+from .redis_client import redis_client
+from .task_definitions import get_task_definition
+from .data_sources import data_source_env_var, data_source_name
+
+logging.basicConfig(level=logging.INFO)
+
+RUN_LIMITS_ENABLED = os.getenv("RUN_LIMITS_ENABLED", "Y").upper() in ("Y", "YES", "TRUE", "1")
+RUN_LIMIT_LEASE_SECONDS = float(os.getenv("RUN_LIMIT_LEASE_SECONDS", "600"))   # slot lease, renewed every third of it while the run lasts
+RUN_LIMIT_RETRY_DELAY = float(os.getenv("RUN_LIMIT_RETRY_DELAY", "10"))        # requeue delay while a concurrency limit is reached
+
+DEFERRALS_HEADER = "run_limit_deferrals"  # times a run was requeued by a limit; not counted against its retry budget
+
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+# Times come from the Redis server (TIME), so clock skew between worker hosts cannot expire other
+# workers' leases early or starve token buckets.
+# KEYS: one per limit. ARGV: lease seconds, token, then per key: kind (sem|bucket), limit, refill rate per second
+# All-or-nothing: returns {1, 0} once every limit granted the run, otherwise {0, wait} where wait is
+# the seconds until the most constrained token bucket refills, or -1 when a semaphore is full.
+_ACQUIRE = redis_client.register_script("""
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local expiry = now + tonumber(ARGV[1])
+local wait = 0
+local full = false
+local buckets = {}
+for i, key in ipairs(KEYS) do
+    local kind = ARGV[(i - 1) * 3 + 3]
+    local limit = tonumber(ARGV[(i - 1) * 3 + 4])
+    local rate = tonumber(ARGV[(i - 1) * 3 + 5])
+    if kind == 'sem' then
+        redis.call('ZREMRANGEBYSCORE', KEYS[i], '-inf', now)
+        if redis.call('ZCARD', KEYS[i]) >= limit then
+            full = true
+        end
+    else
+        local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+        local tokens = tonumber(state[1] or limit)
+        local ts = tonumber(state[2] or now)
+        tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+        buckets[i] = tokens
+        if tokens < 1 then
+            wait = math.max(wait, (1 - tokens) / rate)
+        end
+    end
+end
+if full then
+    return {0, -1}
+end
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local kind = ARGV[(i - 1) * 3 + 3]
+    if kind == 'sem' then
+        redis.call('ZADD', KEYS[i], tostring(expiry), ARGV[2])
+        redis.call('EXPIRE', KEYS[i], math.ceil(tonumber(ARGV[1])) + 60)
+    else
+        local limit = tonumber(ARGV[(i - 1) * 3 + 4])
+        local rate = tonumber(ARGV[(i - 1) * 3 + 5])
+        redis.call('HSET', KEYS[i], 'tokens', tostring(buckets[i] - 1), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[i], math.ceil(limit / rate) + 60)
+    end
+end
+return {1, 0}
+""")
+
+# KEYS: semaphores holding the token. ARGV: lease seconds, token, retake (1|0)
+# Extends the token's leases. A lease that already expired (and was dropped) is only taken back
+# with retake, by a task that knows its run is still alive.
+_RENEW = redis_client.register_script("""
+local time = redis.call('TIME')
+local expiry = tonumber(time[1]) + tonumber(time[2]) / 1000000 + tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    if ARGV[3] == '1' then
+        redis.call('ZADD', key, tostring(expiry), ARGV[2])
+    else
+        redis.call('ZADD', key, 'XX', tostring(expiry), ARGV[2])
+    end
+    redis.call('EXPIRE', key, math.ceil(tonumber(ARGV[1])) + 60)
+end
+return 1
+""")
+
+_held = {}  # token -> [semaphore keys, holders], slots renewed by this process
+# The renewer is a native thread even under gevent, so a run that keeps the hub busy (CPU-bound
+# work, a blocking call) cannot starve it into letting leases lapse; hence the native lock too.
+_held_lock = get_original("_thread", "allocate_lock")()
+_renewer_pid = None
+
+
+class RunLimited(Exception):
+    """A concurrency or rate limit of the run's task or data source is reached; retry_after is in seconds."""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"A run limit of {scope} is reached, retry in {retry_after:.1f}s.")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def parse_rate(value):
+    """
+    '<runs>/<s|m|h>' (as in Celery's rate_limit, e.g. '30/m') -> (capacity, refill per second),
+    or None when unset. Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*/\s*([smh])\s*", str(value).lower())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid rate limit '{value}' (expected e.g. '30/m')")
+    runs = float(match.group(1))
+    return runs, runs / RATE_PERIODS[match.group(2)]
+
+
+def task_limits(task_name, task_definition):
+    """(scope, max concurrency, rate limit) of a task, from its def_async_tasks row."""
+    return (f"task:{task_name}", task_definition.get("max_concurrency"), task_definition.get("rate_limit"))
+
+
+def data_source_limits(def_data_source_id):
+    """
+    (scope, max concurrency, rate limit) of a target database, from DATASOURCE_MAX_CONCURRENCY_<NAME>
+    and DATASOURCE_RATE_LIMIT_<NAME>; the DATABASE_URL database (no data source) is <NAME> = DEFAULT.
+    """
+    name = "DEFAULT" if def_data_source_id is None else data_source_name(def_data_source_id)
+    if not name:
+        return None
+    scope = f"data_source:{'default' if def_data_source_id is None else def_data_source_id}"
+    return (scope,
+            os.getenv(data_source_env_var(name, "DATASOURCE_MAX_CONCURRENCY_")),
+            os.getenv(data_source_env_var(name, "DATASOURCE_RATE_LIMIT_")))
+
+
+def _renew_leases():
+    # Its own client: connections of the shared pool belong to the gevent hub of the main thread
+    renew = Redis.from_url(redis_url, decode_responses=True).register_script(_RENEW.script)
+    sleep = get_original("time", "sleep")
+    while True:
+        sleep(RUN_LIMIT_LEASE_SECONDS / 3)
+        with _held_lock:
+            held = [(token, keys) for token, (keys, _) in _held.items()]
+        for token, keys in held:
+            try:
+                renew(keys=keys, args=[RUN_LIMIT_LEASE_SECONDS, token, 0])
+            except Exception as e:
+                logging.warning(f"Failed to renew run limit slots {keys}: {e}")
+
+
+def _hold(token, keys):
+    """Renew the token's leases from this process until a matching _unhold()."""
+    global _renewer_pid
+    with _held_lock:
+        entry = _held.setdefault(token, [keys, 0])
+        entry[1] += 1
+        # One renewer per process; prefork children start their own
+        start = _renewer_pid != os.getpid()
+        _renewer_pid = os.getpid()
+    if start:
+        get_original("_thread", "start_new_thread")(_renew_leases, ())
+
+
+def _unhold(token):
+    with _held_lock:
+        entry = _held.get(token)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del _held[token]
+
+
+class RunSlot:
+    """
+    Concurrency slots held by one run. Their leases are renewed while the run lasts; release()
+    gives them back (idempotent), and detach() hands them over to a later task (see restore()).
+    """
+
+    def __init__(self, token=None, keys=()):
+        self.token = token
+        self.keys = list(keys)
+
+    @classmethod
+    def restore(cls, state):
+        """The RunSlot of a detach()ed state, or an empty one."""
+        return cls(state["token"], state["keys"]) if state else cls()
+
+    def detach(self):
+        """Stop renewing and releasing the slots here and return them for another task to restore()."""
+        state = {"token": self.token, "keys": self.keys} if self.keys else None
+        if self.keys:
+            _unhold(self.token)
+            self.keys = []
+        return state
+
+    @contextmanager
+    def kept_alive(self):
+        """
+        Renew the leases of a restored slot for the duration of the block (it is not released).
+        The slot is taken back first if its lease lapsed while the handed-over tasks were queued.
+        """
+        if not self.keys:
+            yield self
+            return
+        try:
+            _RENEW(keys=self.keys, args=[RUN_LIMIT_LEASE_SECONDS, self.token, 1])
+        except Exception as e:
+            logging.warning(f"Failed to renew run limit slots {self.keys}: {e}")
+        _hold(self.token, self.keys)
+        try:
+            yield self
+        finally:
+            _unhold(self.token)
+
+    def release(self):
+        if not self.keys:
+            return
+        keys, self.keys = self.keys, []
+        _unhold(self.token)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.zrem(key, self.token)
+            pipe.execute()
+        except Exception as e:
+            logging.warning(f"Failed to release run limit slots {keys}: {e}")
+
+
+def acquire(*limits):
+    """
+    Take a slot in every concurrency limit and a token from every rate limit in limits, all or none,
+    and return the RunSlot. Raises RunLimited when any of them is exhausted; fails open if Redis is down.
+
+    limits are (scope, max concurrency, rate limit) tuples; None entries and unset values are skipped.
+    Concurrency slots are leases of RUN_LIMIT_LEASE_SECONDS renewed while the run lasts, so a worker
+    that dies frees its slots within that time. Rate limits are token buckets holding up to <runs> tokens.
+    """
+    keys, argv, semaphores, scopes = [], [], [], []
+    for limit in limits:
+        if limit is None:
+            continue
+        scope, max_concurrency, rate_limit = limit
+        if max_concurrency not in (None, "") and int(max_concurrency) > 0:
+            key = f"run_limit:sem:{scope}"
+            keys.append(key)
+            semaphores.append(key)
+            argv += ["sem", int(max_concurrency), 0]
+            scopes.append(scope)
+        try:
+            rate = parse_rate(rate_limit)
+        except ValueError as e:
+            logging.warning(f"Ignoring the rate limit of {scope}: {e}")
+            rate = None
+        if rate:
+            keys.append(f"run_limit:bucket:{scope}")
+            argv += ["bucket", rate[0], rate[1]]
+            scopes.append(scope)
+    if not RUN_LIMITS_ENABLED or not keys:
+        return RunSlot()
+
+    token = uuid.uuid4().hex
+    try:
+        granted, wait = _ACQUIRE(keys=keys, args=[RUN_LIMIT_LEASE_SECONDS, token] + argv)
+    except Exception as e:
+        logging.warning(f"Run limits unavailable, running without them: {e}")
+        return RunSlot()
+    if int(granted):
+        if semaphores:
+            _hold(token, semaphores)
+        return RunSlot(token, semaphores)
+
+    wait = float(wait)
+    retry_after = RUN_LIMIT_RETRY_DELAY if wait < 0 else wait
+    raise RunLimited(", ".join(sorted(set(scopes))), retry_after)
+
+
+def deferrals(request):
+    """How many times this run was requeued by a run limit (see DEFERRALS_HEADER)."""
+    return int(getattr(request, DEFERRALS_HEADER, None) or 0)
+
+
+def defer(task, limited):
+    """Requeue the run after limited.retry_after (plus jitter) without using up its retry budget."""
+    countdown = limited.retry_after * random.uniform(1.0, 1.5)
+    logging.info(f"{limited} Requeueing task {task.request.id} in {countdown:.1f}s")
+    headers = dict(task.request.headers or {})
+    headers[DEFERRALS_HEADER] = deferrals(task.request) + 1
+    # max_retries=None would mean the task's default budget; deferrals are unbounded instead
+    return task.retry(countdown=countdown, max_retries=task.request.retries + 1, headers=headers)
+
+
+def acquire_or_defer(task, limits):
+    """
+    acquire() the limits returned by the limits() callable, or requeue the run (raises Retry) when one
+    is exhausted. Limits never fail a run: if they cannot be looked up the run goes ahead without them.
+    """
+    try:
+        return acquire(*limits())
+    except RunLimited as limited:
+        raise defer(task, limited)
+    except Exception as e:
+        logging.warning(f"Could not apply run limits to task {task.request.id}: {e}")
+        return RunSlot()
+
+
+def run_limited(uses_data_source=False):
+    """
+    Decorator for executor tasks (bind=True; task_name is args[2]): holds the task's limits, and
+    with uses_data_source those of its target database, for the duration of the run. A run over a
+    limit is requeued with a delay (self.retry) rather than waiting in a worker slot.
+
+    The slot is self.request.run_slot; a run that finishes in other tasks (a fan-out) detach()es it
+    and hands it over to them.
+    """
+    def decorator(run):
+        @functools.wraps(run)
+        def wrapper(self, *args, **kwargs):
+            task_name = args[2] if len(args) > 2 else None
+
+            def limits():
+                task_definition = get_task_definition(task_name) or {}
+                found = [task_limits(task_name, task_definition)]
+                # A fan-out run only dispatches; each of its subtasks takes its own data source's limits
+                if uses_data_source and task_definition.get("execution_mode") != "fanout":
+                    found.append(data_source_limits(task_definition.get("def_data_source_id")))
+                return found
+
+            slot = acquire_or_defer(self, limits)
+            self.request.run_slot = slot
+            try:
+                return run(self, *args, **kwargs)
+            finally:
+                slot.release()
+        return wrapper
+    return decorator
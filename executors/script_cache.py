@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+
+from celery.worker.control import inspect_command
+
+SCRIPT_CACHE_SIZE = int(os.getenv("SCRIPT_CACHE_SIZE", "128"))  # max compiled scripts kept per worker process
+
+
+class ScriptCache:
+    """
+    Bounded LRU cache of compiled script code objects.
+
+    Entries are keyed by path and validated against the file's mtime and size on every lookup,
+    so an edited script is recompiled on its next run without restarting the worker.
+    """
+
+    def __init__(self, max_entries=SCRIPT_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()   # path -> (mtime_ns, size, code)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """Return the compiled code for path, compiling it if it is new or changed on disk."""
+        st = os.stat(path)
+        version = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                if entry[:2] == version:
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+                    return entry[2]
+                del self._entries[path]
+                self.invalidations += 1
+            self.misses += 1
+
+        with open(path, 'r') as file:
+            code = compile(file.read(), path, 'exec')
+
+        with self._lock:
+            self._entries[path] = (version[0], version[1], code)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return code
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(path, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "max_entries": self.max_entries,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+script_cache = ScriptCache()
+
+
+@inspect_command()
+def script_cache_stats(state):
+    """Compiled-script cache counters: celery -A executors inspect script_cache_stats"""
+    return script_cache.stats()
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import logging
+import tempfile
+import subprocess
+
+from celery.signals import worker_init, worker_shutdown
+from gevent.monkey import is_module_patched
+
+logging.basicConfig(level=logging.INFO)
+
+SPAWNER_ENABLED = os.getenv("SPAWNER_ENABLED", "Y").upper() in ("Y", "YES", "TRUE", "1")
+SPAWNER_SOCKET_DIR = os.getenv("SPAWNER_SOCKET_DIR")  # parent of the private (0700) per-worker socket directory; defaults to the system temp dir
+SPAWNER_START_TIMEOUT = 5.0
+
+_server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spawner_server.py")
+
+
+class SpawnError(OSError):
+    """The launcher was reached but could not start the program (missing file, permissions, ...)."""
+
+
+def _open_reader(fd):
+    # Plain pipe reads would block the whole gevent hub; gevent's FileObject waits cooperatively
+    if is_module_patched("socket"):
+        from gevent.fileobject import FileObjectPosix
+        return FileObjectPosix(fd, "r", encoding="utf-8", errors="replace")
+    return os.fdopen(fd, "r", encoding="utf-8", errors="replace")
+
+
+class SpawnedProcess:
+    """The subset of subprocess.Popen the executors use, for a process started by the launcher."""
+
+    def __init__(self, conn, pid, stdout, stderr):
+        self._conn = conn
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+
+    def wait(self):
+        if self.returncode is None:
+            try:
+                reply = json.loads(self._conn.recv(4096) or b"{}")
+            finally:
+                self._conn.close()
+            self.returncode = reply.get("returncode", -1)
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+class Spawner:
+    """Client for the long-lived launcher process started at worker init (see spawner_server.py)."""
+
+    def __init__(self, socket_path, pid):
+        self.socket_path = socket_path
+        self.pid = pid
+
+    @classmethod
+    def start(cls):
+        # A fresh owner-only directory, so no other local user can predict, squat or reach the socket path
+        socket_dir = tempfile.mkdtemp(prefix="executor-spawner-", dir=SPAWNER_SOCKET_DIR)
+        socket_path = os.path.join(socket_dir, "spawner.sock")
+        try:
+            # posix_spawn the launcher too, so starting it does not fork this (large) process either
+            pid = os.posix_spawn(sys.executable, [sys.executable, _server_script, socket_path, str(os.getpid())], os.environ)
+        except OSError:
+            shutil.rmtree(socket_dir, ignore_errors=True)
+            raise
+
+        spawner = cls(socket_path, pid)
+        try:
+            spawner._wait_until_listening()
+        except BaseException:
+            spawner.stop(kill=True)
+            raise
+        return spawner
+
+    def _wait_until_listening(self):
+        # Ready means a connect() succeeds, not merely that the socket file exists
+        deadline = time.monotonic() + SPAWNER_START_TIMEOUT
+        while True:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            try:
+                probe.connect(self.socket_path)
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass
+            finally:
+                probe.close()
+            if os.waitpid(self.pid, os.WNOHANG) != (0, 0):
+                self.pid = None
+                raise OSError(f"Spawner exited before listening on {self.socket_path}")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Spawner did not start within {SPAWNER_START_TIMEOUT}s")
+            time.sleep(0.01)
+
+    def spawn(self, argv):
+        """Start argv with piped stdout/stderr and return a SpawnedProcess."""
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            conn.connect(self.socket_path)
+            socket.send_fds(conn, [json.dumps({"argv": [str(arg) for arg in argv]}).encode()], [out_w, err_w])
+        except BaseException:
+            conn.close()
+            for fd in (out_r, err_r):
+                os.close(fd)
+            raise
+        finally:
+            os.close(out_w)
+            os.close(err_w)
+
+        try:
+            reply = json.loads(conn.recv(4096) or b"{}")
+        except BaseException:
+            conn.close()
+            os.close(out_r)
+            os.close(err_r)
+            raise
+        if "pid" not in reply:
+            conn.close()
+            os.close(out_r)
+            os.close(err_r)
+            raise SpawnError(reply.get("errno") or 0, reply.get("error", "spawner closed the connection"), str(argv[0]))
+
+        return SpawnedProcess(conn, reply["pid"], _open_reader(out_r), _open_reader(err_r))
+
+    def stop(self, kill=False):
+        if self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGKILL if kill else signal.SIGTERM)
+                os.waitpid(self.pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        shutil.rmtree(os.path.dirname(self.socket_path), ignore_errors=True)
+
+
+_spawner = None
+
+
+def spawn_process(argv):
+    """
+    Start argv with piped stdout/stderr (text mode), through the launcher when it is running,
+    otherwise with subprocess.Popen. Either way the result has stdout, stderr, wait() and kill().
+    """
+    if _spawner is not None:
+        try:
+            return _spawner.spawn(argv)
+        except SpawnError:
+            raise
+        except OSError as e:
+            logging.error(f"Spawner unavailable, falling back to subprocess: {e}")
+
+    return subprocess.Popen(argv, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, errors="replace")
+
+
+@worker_init.connect
+def _start_spawner(**kwargs):
+    global _spawner
+    if not SPAWNER_ENABLED:
+        return
+    try:
+        _spawner = Spawner.start()
+        logging.info(f"Process spawner listening on {_spawner.socket_path}")
+    except Exception as e:
+        logging.error(f"Failed to start process spawner, scripts will be forked from the worker: {e}")
+
+
+@worker_shutdown.connect
+def _stop_spawner(**kwargs):
+    global _spawner
+    if _spawner is not None:
+        _spawner.stop()
+        _spawner = None
@@ -0,0 +1,98 @@
+# spawner_server.py
+#
+# Small launcher ("zygote") process for the bash executor. It is started once per worker by
+# executors/spawner.py and run by file path, so it only loads the standard library and stays
+# tiny no matter how large the worker grows. Each request arrives on a Unix SOCK_SEQPACKET socket
+# together with the stdout/stderr pipe ends (SCM_RIGHTS); the script is launched with
+# posix_spawn, its pid is sent back, and once it exits so is its return code.
+#
+# Usage: python spawner_server.py <socket_path> <parent_pid>
+# (socket_path must be inside a private directory; the worker creates one with tempfile.mkdtemp)
+import os
+import sys
+import json
+import time
+import socket
+import threading
+
+MAX_MESSAGE = 1024 * 1024
+
+
+def _send(conn, message):
+    conn.send(json.dumps(message).encode())
+
+
+def _serve_connection(conn):
+    with conn:
+        try:
+            data, fds, _, _ = socket.recv_fds(conn, MAX_MESSAGE, 2, socket.MSG_CMSG_CLOEXEC)
+        except OSError:
+            return
+        if not data and not fds:
+            return  # readiness probe from Spawner.start()
+        try:
+            if len(fds) != 2:
+                _send(conn, {"error": "expected stdout and stderr descriptors"})
+                return
+            request = json.loads(data)
+            argv = [str(arg) for arg in request["argv"]]
+            file_actions = [
+                (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+                (os.POSIX_SPAWN_DUP2, fds[0], 1),
+                (os.POSIX_SPAWN_DUP2, fds[1], 2),
+            ]
+            pid = os.posix_spawn(argv[0], argv, os.environ, file_actions=file_actions, setsid=True)
+        except OSError as e:
+            _send(conn, {"error": e.strerror or str(e), "errno": e.errno})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            _send(conn, {"error": f"bad request: {e}"})
+            return
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+        try:
+            _send(conn, {"pid": pid})
+        except OSError:
+            pass  # client went away; still reap the child below
+
+        _, status = os.waitpid(pid, 0)
+        try:
+            _send(conn, {"returncode": os.waitstatus_to_exitcode(status)})
+        except OSError:
+            pass
+
+
+def _exit_with_parent(parent_pid, socket_path):
+    while True:
+        if os.getppid() != parent_pid:
+            for remove, path in ((os.unlink, socket_path), (os.rmdir, os.path.dirname(socket_path))):
+                try:
+                    remove(path)
+                except OSError:
+                    pass
+            os._exit(0)
+        time.sleep(1)
+
+
+def serve(socket_path, parent_pid):
+    # socket_path lives in a fresh 0700 directory made by the worker, so nothing is there to unlink
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    # Owner-only from the moment the socket file exists; no other local user may ask it to run scripts
+    previous_umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(previous_umask)
+    server.listen(128)
+
+    threading.Thread(target=_exit_with_parent, args=(parent_pid, socket_path), daemon=True).start()
+
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=_serve_connection, args=(conn,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,67 @@
+import os
+import psycopg2
+from celery import shared_task
+import logging
+from .db_pool import get_pool
+from .query_export import export_query
+from .task_definitions import get_task_definition
+from .envelope import envelope
+from .run_limits import run_limited
+
+logging.basicConfig(level=logging.INFO)
+
+script_path = os.getenv("SCRIPT_PATH_03")  # Base directory for .sql export queries
+
+
+def read_query(full_script_path):
+    """Query text of a .sql file, without the trailing semicolon COPY (...) would reject."""
+    with open(full_script_path, encoding="utf-8") as f:
+        return f.read().strip().rstrip(";").strip()
+
+
+@shared_task(bind=True)
+@run_limited(uses_data_source=True)
+def execute(self, *args, **kwargs):
+    script_name = args[0] if len(args) > 0 else None
+    task_name = args[2] if len(args) > 2 else None
+    params = kwargs  # Bound to the query's %(name)s placeholders
+
+    pool = None
+    conn = None
+
+    try:
+        full_script_path = os.path.join(script_path, script_name)
+        query = read_query(full_script_path)
+        task_definition = get_task_definition(task_name) or {}
+
+        logging.info("Acquiring a pooled database connection for export")
+        pool = get_pool(task_definition.get("def_data_source_id"))
+        conn = pool.getconn()
+
+        with conn.cursor() as cursor:
+            cursor.execute("SET TRANSACTION READ ONLY;")  # exports never write
+        # COPY (...) TO STDOUT into a gzip artifact, one chunk in memory at a time. Always bind a
+        # mapping so '%%' in the query means a literal '%' whether or not the task has parameters
+        output = export_query(conn, query, params or {}, "csv", kind="sql_export")
+        conn.rollback()
+        logging.info(f"Exported {output['rows']} rows ({output['artifact']['size']} bytes) to {output['artifact']['artifact']}")
+
+        return envelope(self.name, args, params, output, "SQL export executed successfully!")
+
+    except FileNotFoundError:
+        return {"error": f"SQL file '{script_name}' not found."}
+    except KeyError as e:
+        return {"error": f"Missing query parameter: {str(e)}"}
+    except psycopg2.Error as db_err:
+        logging.error(f"psycopg2 error (export): {db_err}", exc_info=True)
+        return {"error": f"SQL export failed: {str(db_err)}"}
+    except Exception as e:
+        logging.exception("An unexpected error occurred (export):")
+        return {"error": f"SQL export failed: {str(e)}"}
+
+    finally:
+        if conn is not None:
+            try:
+                pool.putconn(conn)
+            except Exception as e:
+                logging.error(f"Failed to release connection (export): {e}", exc_info=True)
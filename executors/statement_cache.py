@@ -0,0 +1,145 @@
+import os
+import math
+import logging
+import threading
+from decimal import Decimal
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+logging.basicConfig(level=logging.INFO)
+
+PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("PREPARED_STATEMENT_CACHE_SIZE", "64"))  # per connection; 0 disables
+
+_UNPREPARABLE = object()  # cache marker for calls PostgreSQL refused to PREPARE (e.g. ambiguous overloads)
+
+# EXECUTE of a statement that went stale: the routine was replaced with a different result type
+# ("cached plan must not change result type"), or the statement is gone from the session
+_STALE_STATEMENT_ERRORS = (psycopg2.errors.FeatureNotSupported, psycopg2.errors.InvalidSqlStatementName)
+
+_counters = {"hits": 0, "prepared": 0, "evicted": 0, "unpreparable": 0, "invalidated": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection carrying an LRU of its server-side prepared statements."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = OrderedDict()  # (routine, parameter types) -> statement name, least recently used first
+        self.statement_seq = 0
+
+
+def _param_type(value):
+    """
+    Declared type for a parameter, matching how PostgreSQL types the literal psycopg2 would inline
+    (so overload resolution is unchanged), or None for values not worth preparing for.
+    """
+    if value is None or isinstance(value, str):
+        return "unknown"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        if -2 ** 31 <= value < 2 ** 31:
+            return "integer"
+        return "bigint" if -2 ** 63 <= value < 2 ** 63 else "numeric"
+    if isinstance(value, float) and math.isfinite(value):
+        return "numeric"
+    if isinstance(value, Decimal):
+        return "numeric"
+    return None
+
+
+def _prepare(cursor, conn, routine, types):
+    """PREPARE SELECT routine($1, ...) under a fresh name, evicting the least recently used statement if the cache is full."""
+    while len(conn.statements) >= PREPARED_STATEMENT_CACHE_SIZE:
+        _, evicted = conn.statements.popitem(last=False)
+        if evicted is not _UNPREPARABLE:
+            cursor.execute(f"DEALLOCATE {evicted};")
+            _count("evicted")
+
+    conn.statement_seq += 1
+    name = f"fn_stmt_{conn.statement_seq}"
+    signature = f"({', '.join(types)})" if types else ""
+    arguments = ', '.join(f"${i}" for i in range(1, len(types) + 1))
+    # The savepoint keeps a refused PREPARE from aborting the caller's transaction
+    cursor.execute(f"SAVEPOINT prepare_stmt; PREPARE {name}{signature} AS SELECT {routine}({arguments}); RELEASE SAVEPOINT prepare_stmt;")
+    return name
+
+
+def _statement(cursor, conn, routine, key):
+    """The cached statement name for key, preparing it on a miss; _UNPREPARABLE or None to run the call inline."""
+    name = conn.statements.get(key)
+    if name is not None:
+        if name is not _UNPREPARABLE:
+            conn.statements.move_to_end(key)
+            _count("hits")
+        return name
+    try:
+        name = _prepare(cursor, conn, routine, key[1])
+        _count("prepared")
+    except psycopg2.errors.UndefinedFunction as e:
+        # The routine may just not exist yet; the inline call reports it and a later call prepares it
+        cursor.execute("ROLLBACK TO SAVEPOINT prepare_stmt;")
+        logging.info(f"Not preparing {routine}({', '.join(key[1])}): {e}")
+        return None
+    except psycopg2.ProgrammingError as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT prepare_stmt;")
+        logging.info(f"Not preparing {routine}({', '.join(key[1])}): {e}")
+        name = _UNPREPARABLE
+        _count("unpreparable")
+    conn.statements[key] = name
+    return name
+
+
+def execute_function_call(cursor, routine, values):
+    """
+    Run SELECT routine(values...) as EXECUTE of a statement prepared once per connection, keyed by
+    routine name and arity (with the parameter types, so overloads resolve as they would inline),
+    so repeated calls skip parse/analyze and PostgreSQL can reuse the plan.
+
+    Falls back to the plain statement on connections that are not PreparedConnection, when the
+    cache is disabled, for parameter values such as lists and for calls PostgreSQL will not prepare.
+    If the statement went stale (the routine was redefined), the transaction is rolled back and the
+    call re-prepared and run once more, so it should be the first statement of its transaction.
+    """
+    conn = cursor.connection
+    placeholders = ', '.join(['%s'] * len(values))
+    types = tuple(_param_type(value) for value in values)
+    if PREPARED_STATEMENT_CACHE_SIZE <= 0 or not isinstance(conn, PreparedConnection) or None in types:
+        cursor.execute(f"SELECT {routine}({placeholders});", values)
+        return
+
+    key = (routine, types)
+    for attempt in (1, 2):
+        name = _statement(cursor, conn, routine, key)
+        if name is None or name is _UNPREPARABLE:
+            cursor.execute(f"SELECT {routine}({placeholders});", values)
+            return
+        try:
+            if values:
+                cursor.execute(f"EXECUTE {name}({placeholders});", values)
+            else:
+                cursor.execute(f"EXECUTE {name};")
+            return
+        except _STALE_STATEMENT_ERRORS as e:
+            if attempt == 2:
+                raise
+            logging.info(f"Re-preparing stale statement for {routine}: {e}")
+            conn.rollback()
+            del conn.statements[key]
+            if isinstance(e, psycopg2.errors.FeatureNotSupported):
+                cursor.execute(f"DEALLOCATE {name};")
+            _count("invalidated")
+
+
+def statement_cache_stats():
+    with _counters_lock:
+        return dict(_counters, cache_size=PREPARED_STATEMENT_CACHE_SIZE)
@@ -1,45 +1,57 @@
-import os
 import psycopg2
 from celery import shared_task
 import logging
-import json
+from .db_pool import get_pool
+from .query_export import export_query
+from .statement_cache import execute_function_call
+from .envelope import envelope
+from .task_definitions import get_task_definition
+from .run_limits import run_limited
 
-logging.basicConfig(level=logging.INFO)
+# execution_mode values that stream a set-returning function into an artifact, and their format
+STREAM_MODES = {"stream": "ndjson", "stream_csv": "csv"}
 
-db_url = os.getenv("DATABASE_URL")
+logging.basicConfig(level=logging.INFO)
 
 @shared_task(bind=True)
+@run_limited(uses_data_source=True)
 def execute(self, *args, **kwargs):
     stored_function_name = args[0] if len(args) > 0 else None
-    user_task_name = args[1] if len(args) > 1 else None
     task_name = args[2] if len(args) > 2 else None
-    user_schedule_name = args[3] if len(args) > 3 else None
-    redbeat_schedule_name = args[4] if len(args) > 4 else None
-    schedule_type = args[5] if len(args) > 5 else None
-    schedule = args[6] if len(args) > 6 else None
     params = kwargs
 
+    pool = None
     conn = None
     cursor = None
 
     try:
-        logging.info("Attempting to connect to the database for function")
-        conn = psycopg2.connect(db_url)
-        logging.info("Database connection for function successful.")
+        task_definition = get_task_definition(task_name) or {}
+
+        logging.info("Acquiring a pooled database connection for function")
+        pool = get_pool(task_definition.get("def_data_source_id"))
+        conn = pool.getconn()
+        logging.info("Database connection for function acquired.")
 
         if conn is None:
             logging.error("Database connection object for function is None.")
             return {"error": "Failed to establish database connection for function."}
 
-        cursor = conn.cursor()
+        stream_format = STREAM_MODES.get(task_definition.get("execution_mode"))
 
-        if params:
+        if stream_format:
+            # Set-returning function: rows go to an artifact chunk by chunk instead of into memory
             placeholders = ', '.join(['%s'] * len(params))
-            call_query = f"SELECT {stored_function_name}({placeholders});"
-            cursor.execute(call_query, list(params.values()))
-        else:
-            call_query = f"SELECT {stored_function_name}();"
-            cursor.execute(call_query)
+            query = f"SELECT * FROM {stored_function_name}({placeholders})"
+            output = export_query(conn, query, list(params.values()), stream_format, kind="function")
+            conn.commit()
+            logging.info(f"Stored function streamed {output['rows']} rows to {output['artifact']['artifact']}")
+
+            return envelope(self.name, args, params, output, "Stored function executed successfully!")
+
+        cursor = conn.cursor()
+
+        # Prepared once per pooled connection, then EXECUTEd
+        execute_function_call(cursor, stored_function_name, list(params.values()))
 
         output = None
         if cursor.description:
@@ -50,20 +62,7 @@ def execute(self, *args, **kwargs):
 
         conn.commit()
 
-        return {
-            "user_task_name": user_task_name,
-            "task_name": task_name,
-            "executor": self.name,
-            "user_schedule_name": user_schedule_name,
-            "redbeat_schedule_name": redbeat_schedule_name,
-            "schedule_type":schedule_type,
-            "schedule": schedule,
-            "args": args,
-            "kwargs": params,
-            "parameters": params,
-            "result": output,  
-            "message": "Stored function executed successfully!"
-        }
+        return envelope(self.name, args, params, output, "Stored function executed successfully!")
 
     except psycopg2.Error as db_err:
         logging.error(f"psycopg2 error (function): {db_err}", exc_info=True)
@@ -81,6 +80,6 @@ def execute(self, *args, **kwargs):
 
         if conn is not None:
             try:
-                conn.close()
+                pool.putconn(conn)
             except Exception as e:
-                logging.error(f"Failed to close connection (function): {e}", exc_info=True)
+                logging.error(f"Failed to release connection (function): {e}", exc_info=True)
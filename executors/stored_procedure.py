@@ -1,35 +1,162 @@
 import os
+import time
 import psycopg2
-from celery import shared_task
+from celery import shared_task, chain, chord
+from celery.exceptions import Ignore
 import logging
+from datetime import datetime
+from itertools import groupby
+from psycopg2.extras import execute_batch
+from .db_pool import get_pool
+from .models import DefDataSource
+from .task_definitions import get_task_definition
+from .envelope import envelope
+from .run_limits import run_limited, acquire_or_defer, data_source_limits, RunSlot
 
 logging.basicConfig(level=logging.INFO)
 
-db_url = os.getenv("DATABASE_URL")
+PROC_BATCH_COMMIT_EVERY = int(os.getenv("PROC_BATCH_COMMIT_EVERY", "500"))  # default calls per transaction in batch mode
+PROC_BATCH_PAGE_SIZE = int(os.getenv("PROC_BATCH_PAGE_SIZE", "100"))        # calls sent per round trip by execute_batch
+FANOUT_MAX_PARALLEL = int(os.getenv("FANOUT_MAX_PARALLEL", "4"))            # data sources a fan-out run works on at once
+
+
+def call_statement(stored_procedure_name, param_count):
+    placeholders = ', '.join(['%s'] * param_count)
+    return f"CALL {stored_procedure_name}({placeholders});"
+
+
+def call_procedure(cursor, stored_procedure_name, params):
+    """CALL the procedure with the values of params, in order; returns its first output value, if any."""
+    param_values = list(params.values()) if params else []
+    cursor.execute(call_statement(stored_procedure_name, len(param_values)), param_values)
+
+    # If your procedure returns something, fetch it here (optional)
+    try:
+        output = cursor.fetchone()
+    except Exception:
+        output = None
+    return output[0] if output else None
+
+
+def run_batch(conn, stored_procedure_name, items, commit_every=PROC_BATCH_COMMIT_EVERY, page_size=PROC_BATCH_PAGE_SIZE):
+    """
+    Call the procedure once per parameter set over one connection and return one status per item,
+    in input order.
+
+    Items are committed in transactions of commit_every calls, sent page_size calls per round trip
+    with execute_batch. If a transaction fails it is rolled back and replayed call by call, each in
+    its own savepoint, so only the failing items are lost and the rest of the chunk still commits.
+    """
+    statuses = [{"index": index, "ok": False} for index in range(len(items))]
+    commit_every = max(1, int(commit_every))
+
+    with conn.cursor() as cursor:
+        for start in range(0, len(items), commit_every):
+            chunk = []
+            for index in range(start, min(start + commit_every, len(items))):
+                if isinstance(items[index], dict):
+                    chunk.append((index, list(items[index].values())))
+                else:
+                    statuses[index]["error"] = "Each batch item must be an object of procedure parameters."
+
+            try:
+                # Consecutive calls with the same number of parameters share one statement
+                for param_count, group in groupby(chunk, key=lambda item: len(item[1])):
+                    execute_batch(cursor, call_statement(stored_procedure_name, param_count),
+                                  [values for _, values in group], page_size=page_size)
+                conn.commit()
+                for index, _ in chunk:
+                    statuses[index]["ok"] = True
+                continue
+            except psycopg2.Error as e:
+                conn.rollback()
+                logging.warning(f"Batch chunk at item {start} failed, replaying it call by call: {e}")
+
+            for index, values in chunk:
+                cursor.execute("SAVEPOINT batch_item;")
+                try:
+                    cursor.execute(call_statement(stored_procedure_name, len(values)), values)
+                    cursor.execute("RELEASE SAVEPOINT batch_item;")
+                    statuses[index]["ok"] = True
+                except psycopg2.Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT batch_item;")
+                    statuses[index]["error"] = e.diag.message_primary or str(e).strip()
+            conn.commit()
+
+    return statuses
+
 
 @shared_task(bind=True)
+@run_limited(uses_data_source=True)
 def execute(self, *args, **kwargs):
     stored_procedure_name = args[0] if len(args) > 0 else None
-    user_task_name = args[1] if len(args) > 1 else None
     task_name = args[2] if len(args) > 2 else None
-    user_schedule_name = args[3] if len(args) > 3 else None
-    redbeat_schedule_name = args[4] if len(args) > 4 else None
-    schedule_type = args[5] if len(args) > 5 else None
-    schedule = args[6] if len(args) > 6 else None
     params = kwargs
 
+    pool = None
     conn = None
     cursor = None
 
     try:
-        logging.info("Attempting to connect to the database...")
-        conn = psycopg2.connect(db_url)
-        logging.info("Database connection successful.")
+        task_definition = get_task_definition(task_name) or {}
+
+        # Fan-out mode: run the procedure on every data source (or kwargs 'data_sources': [ids]),
+        # at most 'max_parallel' at a time, and merge the outcomes into one result
+        if task_definition.get("execution_mode") == "fanout":
+            params = dict(params)
+            source_ids = params.pop('data_sources', None)
+            max_parallel = params.pop('max_parallel', None) or FANOUT_MAX_PARALLEL
+
+            query = DefDataSource.query
+            if source_ids:
+                query = query.filter(DefDataSource.def_data_source_id.in_(source_ids))
+            data_sources = [(ds.def_data_source_id, ds.datasource_name)
+                            for ds in query.order_by(DefDataSource.def_data_source_id).all()]
+            if not data_sources:
+                return {"error": "No data sources to fan the stored procedure out to."}
+
+            # The run's task-level slot stays taken until merge_fanout, kept alive by the running steps
+            run_slot = self.request.run_slot.detach()
+            header = {"executor": self.name, "args": args, "kwargs": params, "started_at": time.time(),
+                      "run_slot": run_slot}
+            # The merge callback inherits this task's id, so its merged result is this run's request record
+            try:
+                return self.replace(fanout_canvas(header, stored_procedure_name, params, data_sources, max_parallel,
+                                                  run_slot))
+            except Ignore:
+                raise  # scheduled; merge_fanout releases the slot
+            except Exception:
+                RunSlot.restore(run_slot).release()
+                raise
+
+        logging.info("Acquiring a pooled database connection...")
+        pool = get_pool(task_definition.get("def_data_source_id"))
+        conn = pool.getconn()
+        logging.info("Database connection acquired.")
 
         if conn is None:
             logging.error("Database connection object is None.")
             return {"error": "Failed to establish database connection."}
 
+        # Batch mode: {"batch": [{...params...}, ...], "commit_every": 500}
+        if 'batch' in params:
+            items = params.get('batch')
+            if not isinstance(items, list):
+                return {"error": "'batch' must be a list of parameter objects."}
+            commit_every = params.get('commit_every') or PROC_BATCH_COMMIT_EVERY
+
+            statuses = run_batch(conn, stored_procedure_name, items, commit_every)
+            succeeded = sum(1 for item in statuses if item["ok"])
+
+            result = {
+                "total": len(statuses),
+                "succeeded": succeeded,
+                "failed": len(statuses) - succeeded,
+                "items": statuses
+            }
+            return envelope(self.name, args, {"commit_every": commit_every, "batch_size": len(items)}, result,
+                            "Stored procedure batch executed successfully!")
+
         cursor = conn.cursor()
 
         # Add a placeholder for the OUT parameter
@@ -39,39 +166,14 @@ def execute(self, *args, **kwargs):
         # cursor.execute(call_query, (out_param,))  # Execute the stored procedure
         # output = cursor.fetchone()  # Fetch the output
 
-        param_values = list(params.values()) if params else []
-        placeholders = ', '.join(['%s'] * len(param_values))
-        if placeholders:
-            call_query = f"CALL {stored_procedure_name}({placeholders});"
-            cursor.execute(call_query, param_values)
-        else:
-            call_query = f"CALL {stored_procedure_name}();"
-            cursor.execute(call_query)
-
-        # If your procedure returns something, fetch it here (optional)
-        output = None
-        try:
-            output = cursor.fetchone()
-        except Exception:
-            output = None
+        output = call_procedure(cursor, stored_procedure_name, params)
 
         conn.commit()
 
-        return {
-            "user_task_name": user_task_name,
-            "task_name": task_name,
-            "executor": self.name,
-            "user_schedule_name": user_schedule_name,
-            "redbeat_schedule_name": redbeat_schedule_name,
-            "schedule_type": schedule_type,
-            "schedule": schedule,
-            "args": args,
-            "kwargs": params,
-            "parameters": params,
-            "result": output[0] if output else None,  
-            "message": "Stored procedure executed successfully!"
-        }
+        return envelope(self.name, args, params, output, "Stored procedure executed successfully!")
 
+    except Ignore:
+        raise  # raised by self.replace() once the fan-out is scheduled
     except psycopg2.Error as db_err:
         logging.error(f"psycopg2 error: {db_err}", exc_info=True)
         return {"error": f"Stored procedure execution failed: {str(db_err)}"}
@@ -88,10 +190,86 @@ def execute(self, *args, **kwargs):
 
         if conn is not None:
             try:
-                conn.close()
+                pool.putconn(conn)
             except Exception as e:
-                logging.error(f"Failed to close connection: {e}", exc_info=True)
+                logging.error(f"Failed to release connection: {e}", exc_info=True)
+
+
+def fanout_canvas(header, stored_procedure_name, params, data_sources, max_parallel, run_slot=None):
+    """
+    Chord running the procedure once per data source, then merge_fanout. run_slot (the run's
+    detached task-level slot) is passed to every step to keep alive and released by merge_fanout.
+
+    Parallelism is bounded by splitting the sources into max_parallel lanes: each lane is a chain
+    of run_on_data_source steps, one subtask per source, each passing the lane's collected
+    outcomes on to the next, so at most max_parallel sources are worked on at once.
+    """
+    lanes = [[] for _ in range(max(1, min(int(max_parallel), len(data_sources))))]
+    for position, (def_data_source_id, datasource_name) in enumerate(data_sources):
+        lanes[position % len(lanes)].append((position, def_data_source_id, datasource_name))
+
+    chains = []
+    for lane in lanes:
+        first, *rest = lane
+        steps = [run_on_data_source.s([], stored_procedure_name, params, *first, run_slot=run_slot)]
+        steps += [run_on_data_source.s(stored_procedure_name, params, *source, run_slot=run_slot) for source in rest]
+        chains.append(chain(*steps))
+    return chord(chains, merge_fanout.s(header))
+
 
+@shared_task(bind=True)
+def run_on_data_source(self, lane_results, stored_procedure_name, params, position, def_data_source_id, datasource_name,
+                       run_slot=None):
+    """
+    One data source of a fan-out run. Returns lane_results (the previous step's return value) plus
+    this source's outcome and timing; failures are recorded, never raised, so the lane carries on.
+    run_slot is the fan-out run's task-level slot, taken back if it lapsed while the step was queued
+    (deferrals included) and renewed while the step runs.
+    """
+    with RunSlot.restore(run_slot).kept_alive():
+        # Over the data source's limits the step is requeued, and the rest of its lane waits for it
+        slot = acquire_or_defer(self, lambda: [data_source_limits(def_data_source_id)])
+        started = time.perf_counter()
+        item = {
+            "position": position,
+            "def_data_source_id": def_data_source_id,
+            "datasource_name": datasource_name,
+            "started_at": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+        }
+        try:
+            with get_pool(def_data_source_id).connection() as conn:
+                with conn.cursor() as cursor:
+                    item["result"] = call_procedure(cursor, stored_procedure_name, params)
+                conn.commit()
+            item["ok"] = True
+        except Exception as e:
+            logging.error(f"Fan-out of {stored_procedure_name} failed on data source {datasource_name}: {e}")
+            item["ok"] = False
+            item["error"] = str(e).strip()
+        finally:
+            slot.release()
+    item["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return lane_results + [item]
+
+
+@shared_task(bind=True)
+def merge_fanout(self, lanes, header):
+    """Chord callback: one result for the whole fan-out, with the sources in data source order."""
+    RunSlot.restore(header.get("run_slot")).release()  # the fan-out run is over
+    sources = sorted((item for lane in lanes for item in lane), key=lambda item: item["position"])
+    for item in sources:
+        del item["position"]
+    succeeded = sum(1 for item in sources if item["ok"])
+
+    result = {
+        "total": len(sources),
+        "succeeded": succeeded,
+        "failed": len(sources) - succeeded,
+        "elapsed_ms": round((time.time() - header["started_at"]) * 1000, 2),
+        "sources": sources
+    }
+    return envelope(header["executor"], header["args"], header["kwargs"], result,
+                    "Stored procedure fan-out executed successfully!")
 
 # import os
 # import psycopg2
@@ -0,0 +1,35 @@
+import os
+import time
+import threading
+
+from .models import DefAsyncTask
+
+TASK_DEFINITION_TTL = float(os.getenv("TASK_DEFINITION_TTL", "60"))  # seconds a looked-up definition is reused
+
+_definitions = {}   # task_name -> (fetched_at, definition dict or None)
+_lock = threading.Lock()
+
+
+def get_task_definition(task_name):
+    """
+    Return the DefAsyncTask row for task_name as a dict (None if it does not exist).
+
+    Executors use this to read per-task settings. Lookups are cached for TASK_DEFINITION_TTL
+    seconds so frequently scheduled tasks do not query def_async_tasks on every run.
+    Must be called inside the Flask app context, which every executor task runs in.
+    """
+    if not task_name:
+        return None
+
+    now = time.monotonic()
+    with _lock:
+        cached = _definitions.get(task_name)
+    if cached is not None and now - cached[0] < TASK_DEFINITION_TTL:
+        return cached[1]
+
+    task = DefAsyncTask.query.filter_by(task_name=task_name).first()
+    definition = task.json() if task else None
+
+    with _lock:
+        _definitions[task_name] = (now, definition)
+    return definition
@@ -44,7 +44,7 @@ def create_redbeat_schedule_old(schedule_name, executor, schedule_minutes=1, arg
     return {"message": "Task scheduled successfully!", "entry_name": entry.name}
 
 
-def create_redbeat_schedule(schedule_name, executor, schedule_minutes=None, cron_schedule=None, args=None, kwargs=None, celery_app=None):
+def create_redbeat_schedule(schedule_name, executor, schedule_minutes=None, cron_schedule=None, args=None, kwargs=None, celery_app=None, queue=None):
     # Decide whether to use crontab (cron_schedule) or timedelta (schedule_minutes)
     if cron_schedule:
         schedule = cron_schedule  # Cron-based schedule
@@ -67,6 +67,7 @@ def create_redbeat_schedule(schedule_name, executor, schedule_minutes=None, cron
         schedule=schedule,
         args=args,
         kwargs=kwargs,
+        options={"queue": queue} if queue else {},  # per-task queue; task_routes otherwise
         app=celery_app
         )
         entry.save()
@@ -133,7 +134,7 @@ def create_redbeat_schedule(schedule_name, executor, schedule_minutes=None, cron
         raise
 
 
-def update_redbeat_schedule(schedule_name, task, schedule_minutes=None, cron_schedule=None, args=None, kwargs=None, celery_app=None):
+def update_redbeat_schedule(schedule_name, task, schedule_minutes=None, cron_schedule=None, args=None, kwargs=None, celery_app=None, queue=None):
    
     # Default values for args and kwargs
     args = args or []
@@ -158,6 +159,9 @@ def update_redbeat_schedule(schedule_name, task, schedule_minutes=None, cron_sch
         # Update entry fields
         entry.args = args
         entry.kwargs = kwargs
+        entry.options.pop("queue", None)
+        if queue:
+            entry.options["queue"] = queue
 
         # Save the updated entry back to Redis
         entry.save()
@@ -169,6 +173,26 @@ def update_redbeat_schedule(schedule_name, task, schedule_minutes=None, cron_sch
 
 
 
+def update_redbeat_queue(schedule_name, queue, celery_app=None):
+    """Send an existing RedBeat entry's runs to queue (None: back to task_routes), keeping its schedule."""
+    try:
+        entry = RedBeatSchedulerEntry.from_key(f"redbeat:{schedule_name}", app=celery_app)
+    except KeyError:
+        return False  # already deleted from Redis (finished ONCE schedules, cancelled ones)
+
+    try:
+        entry.options.pop("queue", None)
+        if queue:
+            entry.options["queue"] = queue
+        entry.save()
+        print(f" RedBeat entry queue updated: {entry.name}")
+        return True
+
+    except Exception as e:
+        print(f" Failed to update RedBeat entry queue: {e}")
+        raise
+
+
 def delete_schedule_from_redis(schedule_name):
     try:
         # Get Redis client from Celery's broker connection